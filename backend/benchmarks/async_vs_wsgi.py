@@ -0,0 +1,88 @@
+"""Сравнение синхронного (WSGI) и асинхронного (ASGI) read-пути.
+
+Поднимает проект дважды на одной базе: gunicorn с синхронными
+воркерами и gunicorn с воркерами uvicorn при ASYNC_READ_PATH=True, —
+и нагружает оба одинаковым набором GET-запросов. Печатает запросы
+в секунду и задержки p50/p99 для каждого уровня конкурентности.
+
+Запуск из каталога backend:
+
+    python -m benchmarks.async_vs_wsgi --concurrency 16 64 256
+
+Нужны данные в базе (manage.py load_ingredients, рецепты). Кэш ответов
+по умолчанию выключен, чтобы мерить работу с базой, а не попадания
+в кэш; --with-cache оставляет его включённым.
+"""
+import argparse
+import asyncio
+
+from .loadgen import run
+from .servers import SERVERS, start_server
+
+DEFAULT_PATHS = [
+    '/api/recipes/',
+    '/api/recipes/?page=2',
+    '/api/recipes/?tags=breakfast',
+    '/api/tags/',
+    '/api/ingredients/?name=сол',
+]
+
+
+def print_table(kind, concurrency, result):
+    print(f'\n{kind}, concurrency={concurrency}')
+    print(f'{"endpoint":40} {"rps":>8} {"p50 ms":>8} '
+          f'{"p99 ms":>8} {"errors":>7}')
+    for name, item in result.items():
+        print(
+            f'{name:40} {item["rps"]:8.1f} {item["p50_ms"]:8.1f} '
+            f'{item["p99_ms"]:8.1f} {item["errors"]:7}'
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        '--concurrency', type=int, nargs='+', default=[16, 64, 256]
+    )
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--warmup', type=float, default=2)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--paths', nargs='+', default=DEFAULT_PATHS)
+    parser.add_argument(
+        '--token', help='Токен пользователя для авторизованных запросов.'
+    )
+    parser.add_argument('--with-cache', action='store_true')
+    parser.add_argument(
+        '--servers', nargs='+', choices=SERVERS, default=list(SERVERS)
+    )
+    args = parser.parse_args()
+
+    requests = [(path, 'GET', path, {}, b'') for path in args.paths]
+    headers = {'Authorization': f'Token {args.token}'} if args.token else {}
+    summary = []
+    for kind in args.servers:
+        process, base = start_server(kind, args.workers, args.with_cache)
+        try:
+            asyncio.run(run(base, requests, 4, args.warmup, headers))
+            for concurrency in args.concurrency:
+                result = asyncio.run(run(
+                    base, requests, concurrency, args.duration, headers
+                ))
+                print_table(kind, concurrency, result)
+                summary.append((kind, concurrency, result['*']))
+        finally:
+            process.terminate()
+            process.wait()
+
+    print(f'\n{"server":6} {"conc":>5} {"rps":>8} {"p50 ms":>8} '
+          f'{"p99 ms":>8} {"errors":>7}')
+    for kind, concurrency, total in summary:
+        print(
+            f'{kind:6} {concurrency:5} {total["rps"]:8.1f} '
+            f'{total["p50_ms"]:8.1f} {total["p99_ms"]:8.1f} '
+            f'{total["errors"]:7}'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+"""Генератор HTTP-нагрузки на asyncio без сторонних зависимостей.
+
+Держит concurrency одновременных клиентов, каждый по кругу запрашивает
+адреса из списка. Соединение переиспользуется, если сервер не прислал
+Connection: close (синхронный gunicorn закрывает его после ответа).
+"""
+import asyncio
+import time
+from urllib.parse import quote, urlsplit
+
+
+def percentile(values, share):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(share * len(values)) - 1))
+    return values[index]
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self.statuses = {}
+
+    def add(self, status, latency):
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        if status >= 400:
+            self.errors += 1
+        self.latencies.append(latency)
+
+    def summary(self, elapsed):
+        return {
+            'requests': len(self.latencies),
+            'errors': self.errors,
+            'rps': len(self.latencies) / elapsed if elapsed else 0.0,
+            'p50_ms': percentile(self.latencies, 0.5) * 1000,
+            'p90_ms': percentile(self.latencies, 0.9) * 1000,
+            'p99_ms': percentile(self.latencies, 0.99) * 1000,
+            'statuses': dict(sorted(self.statuses.items())),
+        }
+
+
+class Connection:
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.reader = self.writer = None
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+        self.reader = self.writer = None
+
+    async def read_body(self, headers):
+        if headers.get('transfer-encoding') == 'chunked':
+            while True:
+                size = int((await self.reader.readline()).strip(), 16)
+                await self.reader.readexactly(size + 2)
+                if not size:
+                    return
+        length = headers.get('content-length')
+        if length is not None:
+            await self.reader.readexactly(int(length))
+        else:
+            await self.reader.read()
+            headers['connection'] = 'close'
+
+    async def request(self, method, path, headers, body=b''):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(
+                self.host, self.port
+            )
+        path = quote(path, safe="/?&=%:+,;@")
+        lines = [f'{method} {path} HTTP/1.1', f'Host: {self.host}']
+        lines += [f'{name}: {value}' for name, value in headers.items()]
+        if body:
+            lines.append(f'Content-Length: {len(body)}')
+        self.writer.write(
+            ('\r\n'.join(lines) + '\r\n\r\n').encode('latin1') + body
+        )
+        await self.writer.drain()
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError('Сервер закрыл соединение')
+        status = int(status_line.split()[1])
+        response_headers = {}
+        while True:
+            line = (await self.reader.readline()).decode('latin1').strip()
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            response_headers[name.strip().lower()] = value.strip().lower()
+        await self.read_body(response_headers)
+        if response_headers.get('connection') == 'close':
+            await self.close()
+        return status
+
+
+async def client(base, requests, headers, deadline, stats, position):
+    url = urlsplit(base)
+    connection = Connection(url.hostname, url.port or 80)
+    try:
+        while time.monotonic() < deadline:
+            name, method, path, extra, body = requests[
+                position % len(requests)
+            ]
+            position += 1
+            started = time.perf_counter()
+            try:
+                status = await connection.request(
+                    method, url.path.rstrip('/') + path,
+                    {**headers, **extra}, body,
+                )
+            except (OSError, ConnectionError, asyncio.IncompleteReadError):
+                await connection.close()
+                status = 599
+            stats.setdefault(name, Stats()).add(
+                status, time.perf_counter() - started
+            )
+    finally:
+        await connection.close()
+
+
+async def run(base, requests, concurrency, duration, headers=None):
+    """Нагружает base запросами requests в течение duration секунд.
+
+    requests — список (имя, метод, путь, заголовки, тело) или функция,
+    возвращающая такой список для номера клиента (например, со своим
+    токеном у каждого). Возвращает {имя: сводка} и общую сводку под
+    ключом '*'.
+    """
+    headers = {'Accept': 'application/json', **(headers or {})}
+    stats = {}
+    started = time.monotonic()
+    deadline = started + duration
+    await asyncio.gather(*(
+        # Общий список клиенты начинают с разных мест, свой — с начала.
+        client(base, requests(offset), headers, deadline, stats, 0)
+        if callable(requests)
+        else client(base, requests, headers, deadline, stats, offset)
+        for offset in range(concurrency)
+    ))
+    elapsed = time.monotonic() - started
+    total = Stats()
+    for item in stats.values():
+        total.latencies += item.latencies
+        total.errors += item.errors
+        for status, count in item.statuses.items():
+            total.statuses[status] = total.statuses.get(status, 0) + count
+    result = {name: item.summary(elapsed) for name, item in stats.items()}
+    result['*'] = total.summary(elapsed)
+    return result
@@ -0,0 +1,173 @@
+"""Нагрузочный прогон сценариев из requests.http.
+
+1. Создать набор данных (из backend/foodgram_backend):
+
+       python manage.py seed_dataset --users 200 --recipes 5000 \\
+           --output ../benchmarks/dataset.json
+
+2. Прогнать сценарии (из backend):
+
+       python -m benchmarks.replay --dataset benchmarks/dataset.json \\
+           --concurrency 32 --duration 30 --json results.json
+
+По умолчанию поднимается gunicorn (--server wsgi или asgi); --base
+направляет нагрузку на уже запущенный сервер. Для каждого сценария
+печатаются RPS, задержки p50/p90/p99, число ошибок и число SQL-запросов
+на один запрос — его меряет отдельный прогон в этом процессе через
+django.test.Client и CaptureQueriesContext, с выключенным кэшем
+ответов. С --baseline результаты сравниваются с сохранённым прогоном;
+если у какого-то сценария выросло число запросов, код выхода 1.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+
+from .loadgen import run
+from .scenarios import MIXES, adapt, load_scenarios
+from .servers import APP_DIR, SERVERS, start_server
+
+
+def count_queries(scenarios, dataset):
+    """Число SQL-запросов на каждый сценарий при выключенном кэше."""
+    sys.path.insert(0, str(APP_DIR))
+    os.environ.setdefault(
+        'DJANGO_SETTINGS_MODULE', 'foodgram_backend.settings'
+    )
+    import django
+    django.setup()
+    # Ответы 4xx ожидаемы и не должны засорять вывод.
+    logging.getLogger('django.request').setLevel(logging.ERROR)
+    from django.conf import settings
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext, override_settings
+
+    timeouts = {name: 0 for name in settings.RESPONSE_CACHE['TIMEOUTS']}
+    client = Client(raise_request_exception=False, HTTP_HOST='127.0.0.1')
+    queries = {}
+    with override_settings(RESPONSE_CACHE={
+        **settings.RESPONSE_CACHE, 'TIMEOUTS': timeouts,
+    }):
+        for scenario in scenarios:
+            name, method, path, headers, body = adapt(scenario, dataset, 0)
+            meta = {
+                'HTTP_' + key.upper().replace('-', '_'): value
+                for key, value in headers.items()
+                if key.lower() != 'content-type'
+            }
+            with CaptureQueriesContext(connection) as captured:
+                client.generic(
+                    method, path, body,
+                    content_type=headers.get(
+                        'Content-Type', 'application/octet-stream'
+                    ),
+                    **meta,
+                )
+            queries[name] = len(captured)
+    return queries
+
+
+def print_table(result):
+    print(f'{"scenario":60} {"rps":>7} {"p50":>7} {"p90":>7} {"p99":>7} '
+          f'{"err":>5} {"sql":>4}')
+    for name, item in result.items():
+        print(
+            f'{name[:60]:60} {item["rps"]:7.1f} {item["p50_ms"]:7.1f} '
+            f'{item["p90_ms"]:7.1f} {item["p99_ms"]:7.1f} '
+            f'{item["errors"]:5} {item.get("queries", "")!s:>4}'
+        )
+
+
+def compare(result, baseline):
+    """Печатает изменения относительно baseline; True — если хуже по SQL."""
+    worse = False
+    print(f'\n{"scenario":60} {"rps":>8} {"p99":>8} {"sql":>6}')
+    for name, item in result.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        rps = (item['rps'] / before['rps'] - 1) * 100 if before['rps'] else 0
+        p99 = (
+            (item['p99_ms'] / before['p99_ms'] - 1) * 100
+            if before['p99_ms'] else 0
+        )
+        sql = ''
+        if item.get('queries') is not None and (
+            before.get('queries') is not None
+        ):
+            delta = item['queries'] - before['queries']
+            worse = worse or delta > 0
+            sql = f'{delta:+d}'
+        print(f'{name[:60]:60} {rps:+7.1f}% {p99:+7.1f}% {sql:>6}')
+    return worse
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dataset', required=True)
+    parser.add_argument('--mix', choices=MIXES, default='read')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--warmup', type=float, default=2)
+    parser.add_argument('--base', help='Адрес уже запущенного сервера.')
+    parser.add_argument('--server', choices=SERVERS, default='wsgi')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--with-cache', action='store_true')
+    parser.add_argument(
+        '--no-queries', action='store_true',
+        help='Не считать SQL-запросы в процессе.',
+    )
+    parser.add_argument('--json', help='Сохранить результаты в файл.')
+    parser.add_argument('--baseline', help='Сравнить с сохранённым файлом.')
+    return parser.parse_args()
+
+
+def load(args, requests):
+    process = None
+    base = args.base
+    if base is None:
+        process, base = start_server(
+            args.server, args.workers, args.with_cache
+        )
+    try:
+        asyncio.run(run(base, requests, 2, args.warmup))
+        return asyncio.run(
+            run(base, requests, args.concurrency, args.duration)
+        )
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+
+def main():
+    args = parse_args()
+    with open(args.dataset, encoding='utf-8') as file:
+        dataset = json.load(file)
+    scenarios, skipped = load_scenarios(mix=args.mix)
+    for name, reason in skipped:
+        print(f'пропущен {name}: {reason}')
+
+    result = load(args, lambda number: [
+        adapt(scenario, dataset, number) for scenario in scenarios
+    ])
+    if not args.no_queries:
+        for name, count in count_queries(scenarios, dataset).items():
+            if name in result:
+                result[name]['queries'] = count
+    print()
+    print_table(result)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump(result, file, ensure_ascii=False, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as file:
+            if compare(result, json.load(file)):
+                sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
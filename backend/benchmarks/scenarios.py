@@ -0,0 +1,162 @@
+"""Сценарии нагрузки из файлов requests.http.
+
+Файлы в формате REST Client: запросы разделены строками ###, после
+### может идти название. Из каждого блока берутся метод, путь,
+заголовки и тело; адрес сервера отбрасывается. Перед отправкой
+сценарий подгоняется под набор данных из manage.py seed_dataset:
+у каждого виртуального клиента свой токен, свои рецепты и авторы,
+а тела запросов получают существующие теги и ингредиенты.
+"""
+import json
+import re
+from collections import namedtuple
+from pathlib import Path
+from urllib.parse import urlsplit
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+HTTP_FILES = [
+    BACKEND_DIR.parent / 'requests.http',
+    BACKEND_DIR / 'requests.http',
+]
+
+METHODS = ('GET', 'POST', 'PUT', 'PATCH', 'DELETE')
+
+Scenario = namedtuple('Scenario', 'name method path headers body')
+
+# Сценарии, которые нельзя повторять под нагрузкой.
+SKIPPED = {
+    ('POST', '/api/users/'): 'регистрация с одними и теми же данными',
+    ('POST', '/api/users/set_password/'): 'меняет пароль пользователя',
+}
+WRITE_RE = re.compile(r'/(favorite|shopping_cart|subscribe)/$')
+RECIPE_RE = re.compile(r'^/api/recipes/\d+/')
+USER_RE = re.compile(r'^/api/users/\d+/')
+AUTHOR_RE = re.compile(r'([?&]author=)\d+')
+
+
+def parse_block(title, lines):
+    lines = [line for line in lines if not line.startswith(('#', '//'))]
+    while lines and not lines[0].strip():
+        lines.pop(0)
+    if not lines or not lines[0].startswith(METHODS):
+        return None
+    method, url = lines[0].split()[:2]
+    url = urlsplit(url)
+    path = url.path + (f'?{url.query}' if url.query else '')
+    headers = {}
+    position = 1
+    while position < len(lines) and lines[position].strip():
+        name, _, value = lines[position].partition(':')
+        headers[name.strip()] = value.strip()
+        position += 1
+    body = '\n'.join(lines[position:]).strip()
+    name = ' '.join(filter(None, (
+        method, path,
+        '[token]' if 'Authorization' in headers else '',
+        f'({title})' if title else '',
+    )))
+    return Scenario(name, method, path, headers, body)
+
+
+def parse_http(path):
+    scenarios = []
+    title, lines = '', []
+    with open(path, encoding='utf-8') as file:
+        for line in file.read().splitlines():
+            if line.startswith('###'):
+                scenarios.append(parse_block(title, lines))
+                title, lines = line[3:].strip(), []
+            else:
+                lines.append(line)
+    scenarios.append(parse_block(title, lines))
+    return [scenario for scenario in scenarios if scenario]
+
+
+def kind(scenario):
+    """read, write или heavy — в какой набор входит сценарий."""
+    if scenario.method == 'GET':
+        return 'read'
+    if WRITE_RE.search(scenario.path):
+        return 'write'
+    return 'heavy'
+
+
+MIXES = {
+    'read': {'read'},
+    'write': {'read', 'write'},
+    'all': {'read', 'write', 'heavy'},
+}
+
+
+def load_scenarios(files=HTTP_FILES, mix='read'):
+    """Сценарии из files без повторов; возвращает (сценарии, пропуски)."""
+    scenarios, skipped, seen = [], [], set()
+    for path in files:
+        for scenario in parse_http(path):
+            key = (
+                scenario.method, scenario.path,
+                'Authorization' in scenario.headers, scenario.body,
+            )
+            if key in seen:
+                continue
+            seen.add(key)
+            reason = SKIPPED.get((scenario.method, scenario.path))
+            if reason is None and 'error' in scenario.name.lower():
+                reason = 'ожидаемая ошибка'
+            if reason is None and kind(scenario) not in MIXES[mix]:
+                reason = f'не входит в набор {mix}'
+            if reason:
+                skipped.append((scenario.name, reason))
+            else:
+                scenarios.append(scenario)
+    return scenarios, skipped
+
+
+def adapt_body(body, user, dataset):
+    if not body:
+        return b''
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return body.encode()
+    if 'email' in data and 'password' in data:
+        data.update(email=user['email'], password=dataset['password'])
+    if 'tags' in data:
+        data['tags'] = dataset['tags'][:len(data['tags'])]
+    if 'ingredients' in data:
+        data['ingredients'] = [
+            dict(item, id=ingredient_id)
+            for item, ingredient_id in zip(
+                data['ingredients'], dataset['ingredients']
+            )
+        ]
+    return json.dumps(data).encode()
+
+
+def adapt(scenario, dataset, number):
+    """Сценарий для клиента number: (имя, метод, путь, заголовки, тело)."""
+    users = dataset['users']
+    user = users[number % len(users)]
+    other = users[(number + 1) % len(users)]
+    path = scenario.path
+    if RECIPE_RE.match(path):
+        if scenario.method in ('PUT', 'PATCH', 'DELETE') and not (
+            WRITE_RE.search(path)
+        ) and user['recipes']:
+            recipe_id = user['recipes'][0]
+        else:
+            recipes = dataset['recipes']
+            recipe_id = recipes[number % len(recipes)]
+        path = RECIPE_RE.sub(f'/api/recipes/{recipe_id}/', path)
+    path = USER_RE.sub(f'/api/users/{other["id"]}/', path)
+    path = AUTHOR_RE.sub(fr'\g<1>{other["id"]}', path)
+    headers = {
+        name: value for name, value in scenario.headers.items()
+        if name != 'Authorization'
+    }
+    if 'Authorization' in scenario.headers:
+        headers['Authorization'] = f'Token {user["token"]}'
+    return (
+        scenario.name, scenario.method, path, headers,
+        adapt_body(scenario.body, user, dataset),
+    )
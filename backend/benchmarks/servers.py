@@ -0,0 +1,60 @@
+"""Запуск проекта под gunicorn для нагрузочных тестов."""
+import os
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent / 'foodgram_backend'
+
+SERVERS = {
+    'wsgi': {
+        'app': 'foodgram_backend.wsgi:application',
+        'args': ['--worker-class', 'sync'],
+        'env': {'ASYNC_READ_PATH': 'False'},
+    },
+    'asgi': {
+        'app': 'foodgram_backend.asgi:application',
+        'args': ['--worker-class', 'uvicorn.workers.UvicornWorker'],
+        'env': {'ASYNC_READ_PATH': 'True'},
+    },
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('Сервер завершился при запуске')
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'Сервер не открыл порт {port} за {timeout} с')
+
+
+def start_server(kind, workers, with_cache):
+    port = free_port()
+    server = SERVERS[kind]
+    env = {**os.environ, **server['env']}
+    if not with_cache:
+        for name in ('RECIPES', 'TAGS', 'INGREDIENTS'):
+            env[f'{name}_CACHE_TIMEOUT'] = '0'
+    process = subprocess.Popen(
+        [
+            sys.executable, '-m', 'gunicorn', server['app'],
+            '--bind', f'127.0.0.1:{port}', '--workers', str(workers),
+            '--log-level', 'warning', *server['args'],
+        ],
+        cwd=APP_DIR, env=env,
+    )
+    wait_for_port(port, process)
+    return process, f'http://127.0.0.1:{port}'
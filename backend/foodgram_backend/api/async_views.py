@@ -0,0 +1,259 @@
+"""Асинхронные версии read-эндпоинтов для запуска под ASGI.
+
+Список и карточка рецепта, теги и автодополнение ингредиентов читают
+базу асинхронным ORM и не держат поток на время запроса. То, что есть
+только в синхронном виде (аутентификация и права DRF, фильтры
+django-filter, версии кэша), выполняется через sync_to_async. Запросы,
+которые этот путь не обслуживает (запись, курсорная пагинация), уходят
+в обычные viewset'ы, поэтому адреса и формат ответов не меняются.
+Атрибуты кэша, ETag и пагинации берутся у тех же viewset'ов.
+Включается настройкой ASYNC_READ_PATH.
+"""
+from collections import OrderedDict
+from urllib.parse import unquote
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from rest_framework import status
+from rest_framework.exceptions import (APIException, AuthenticationFailed,
+                                       NotAuthenticated, NotFound)
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .cache import get_cache, make_key
+from .mixins import ReplicaReadMixin, add_validators
+from .views import IngredientViewSet, RecipeViewSet, TagViewSet
+from foodgram_backend.routers import use_replica
+from recipes.autocomplete import ingredient_index
+
+
+def render(data, status_code=status.HTTP_200_OK):
+    return HttpResponse(
+        JSONRenderer().render(data),
+        status=status_code,
+        content_type='application/json',
+    )
+
+
+async def paginate(paginator, queryset, request):
+    """Номерная пагинация CustomPagination на асинхронном ORM."""
+    page_size = paginator.get_page_size(request)
+    number = request.query_params.get(paginator.page_query_param, 1)
+    try:
+        number = int(number)
+        if number < 1:
+            raise ValueError
+    except (TypeError, ValueError):
+        raise NotFound(paginator.invalid_page_message)
+    offset = (number - 1) * page_size
+    count = await queryset.acount()
+    if offset and offset >= count:
+        raise NotFound(paginator.invalid_page_message)
+    results = [obj async for obj in queryset[offset:offset + page_size]]
+    url = request.build_absolute_uri()
+    next_url = previous_url = None
+    if offset + page_size < count:
+        next_url = replace_query_param(
+            url, paginator.page_query_param, number + 1
+        )
+    if number == 2:
+        previous_url = remove_query_param(url, paginator.page_query_param)
+    elif number > 2:
+        previous_url = replace_query_param(
+            url, paginator.page_query_param, number - 1
+        )
+    return results, OrderedDict([
+        ('count', count),
+        ('next', next_url),
+        ('previous', previous_url),
+    ])
+
+
+class AsyncReadView:
+    """GET через асинхронный обработчик, остальное — через viewset.
+
+    viewset и action задают синхронный аналог: у него берутся права,
+    настройки кэша, ETag и пагинации; fallback_actions — отображение
+    методов для запросов, которые идут в обычный viewset.
+    """
+    viewset = None
+    action = None
+    basename = None
+    fallback_actions = {}
+
+    def __init__(self):
+        self.fallback = sync_to_async(self.viewset.as_view(
+            self.fallback_actions, basename=self.basename
+        ))
+
+    @classmethod
+    def as_view(cls):
+        self = cls()
+
+        async def view(request, *args, **kwargs):
+            return await self.dispatch(request, *args, **kwargs)
+
+        # Как и у DRF, CSRF проверяют классы аутентификации.
+        view.csrf_exempt = True
+        return view
+
+    def handles(self, request):
+        return request.method == 'GET'
+
+    def get_view(self, request, kwargs):
+        return self.viewset(
+            action=self.action, basename=self.basename, kwargs=kwargs,
+            request=request, args=(), format_kwarg=None,
+        )
+
+    def initial(self, view, request):
+        view.perform_authentication(request)
+        view.check_permissions(request)
+        view.check_throttles(request)
+
+    async def dispatch(self, request, *args, **kwargs):
+        drf_request = Request(
+            request, authenticators=self.viewset().get_authenticators()
+        )
+        if not self.handles(drf_request):
+            return await self.fallback(request, *args, **kwargs)
+        view = self.get_view(drf_request, kwargs)
+        try:
+            await sync_to_async(self.initial)(view, drf_request)
+            with use_replica(isinstance(view, ReplicaReadMixin)):
+                return await self.respond(view, drf_request)
+        except APIException as exc:
+            return self.handle_exception(view, drf_request, exc)
+
+    def handle_exception(self, view, request, exc):
+        if isinstance(exc.detail, (list, dict)):
+            data = exc.detail
+        else:
+            data = {'detail': exc.detail}
+        response = render(data, exc.status_code)
+        if isinstance(exc, (NotAuthenticated, AuthenticationFailed)):
+            header = view.get_authenticate_header(request)
+            if header:
+                response['WWW-Authenticate'] = header
+            else:
+                response.status_code = status.HTTP_403_FORBIDDEN
+        return response
+
+    async def respond(self, view, request):
+        return await self.cached(view, request)
+
+    async def get_data(self, view, request):
+        raise NotImplementedError
+
+    async def cached(self, view, request):
+        """Асинхронный аналог CachedResponseMixin.cached."""
+        if not view.is_cacheable(request):
+            return render(await self.get_data(view, request))
+        cache = get_cache()
+        key = await sync_to_async(make_key)(request, view.cache_scopes)
+        data = await cache.aget(key)
+        if data is not None:
+            response = render(data)
+            response['X-Cache'] = 'HIT'
+            return response
+        data = await self.get_data(view, request)
+        await cache.aset(
+            key, data,
+            settings.RESPONSE_CACHE['TIMEOUTS'].get(view.basename),
+        )
+        response = render(data)
+        response['X-Cache'] = 'MISS'
+        return response
+
+
+class ConditionalReadView(AsyncReadView):
+    """AsyncReadView с ETag и Last-Modified из ConditionalGetMixin."""
+
+    async def respond(self, view, request):
+        etag, last_modified = await sync_to_async(view.get_validators)(
+            request
+        )
+        if etag is None:
+            return await super().respond(view, request)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified,
+        )
+        if response is None:
+            response = await super().respond(view, request)
+        return add_validators(response, etag, last_modified)
+
+
+class RecipeListView(ConditionalReadView):
+    viewset = RecipeViewSet
+    action = 'list'
+    basename = 'recipes'
+    fallback_actions = {'get': 'list', 'post': 'create'}
+
+    def handles(self, request):
+        return super().handles(request) and not (
+            self.viewset.pagination_class().use_cursor(request)
+        )
+
+    async def get_data(self, view, request):
+        queryset = await sync_to_async(view.filter_queryset)(
+            view.get_queryset()
+        )
+        page, meta = await paginate(view.paginator, queryset, request)
+        meta['results'] = view.get_serializer(page, many=True).data
+        return meta
+
+
+class RecipeDetailView(ConditionalReadView):
+    viewset = RecipeViewSet
+    action = 'retrieve'
+    basename = 'recipes'
+    fallback_actions = {
+        'get': 'retrieve',
+        'put': 'update',
+        'patch': 'partial_update',
+        'delete': 'destroy',
+    }
+
+    async def get_data(self, view, request):
+        try:
+            recipe = await view.get_queryset().aget(pk=view.kwargs['pk'])
+        except view.queryset.model.DoesNotExist:
+            raise NotFound
+        await sync_to_async(view.check_object_permissions)(request, recipe)
+        return view.get_serializer(recipe).data
+
+
+class TagListView(AsyncReadView):
+    viewset = TagViewSet
+    action = 'list'
+    basename = 'tags'
+    fallback_actions = {'get': 'list', 'post': 'create'}
+
+    async def get_data(self, view, request):
+        tags = [tag async for tag in view.get_queryset()]
+        return view.get_serializer(tags, many=True).data
+
+
+class IngredientListView(AsyncReadView):
+    viewset = IngredientViewSet
+    action = 'list'
+    basename = 'ingredients'
+    fallback_actions = {'get': 'list'}
+
+    async def get_data(self, view, request):
+        name = request.query_params.get('name', '')
+        if name.startswith('%'):
+            name = unquote(name)
+        ingredients = await ingredient_index.asearch(
+            name, view.get_limit(name)
+        )
+        return view.get_serializer(ingredients, many=True).data
+
+
+recipe_list = RecipeListView.as_view()
+recipe_detail = RecipeDetailView.as_view()
+tag_list = TagListView.as_view()
+ingredient_list = IngredientListView.as_view()
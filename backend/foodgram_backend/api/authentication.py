@@ -0,0 +1,112 @@
+"""Аутентификация по токену без запроса к базе на каждый вызов.
+
+Пользователь по ключу токена ищется сначала в LRU внутри процесса
+(короткий LOCAL_TTL), затем в общем кэше SHARED_ALIAS (SHARED_TTL), и
+только потом в базе. При удалении токена (token/logout) и изменении
+пользователя, в том числе деактивации, запись удаляется из общего кэша
+и из LRU текущего процесса; в других процессах она доживает не дольше
+LOCAL_TTL.
+"""
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+CACHE_KEY = 'auth-token:{}'
+
+
+class LRUCache:
+    """Потокобезопасный LRU с временем жизни записей."""
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.items.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self.items[key]
+                return None
+            self.items.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.items[key] = (time.monotonic() + self.ttl, value)
+            self.items.move_to_end(key)
+            while len(self.items) > self.size:
+                self.items.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.items.pop(key, None)
+
+
+local_cache = LRUCache(
+    settings.TOKEN_AUTH_CACHE['SIZE'], settings.TOKEN_AUTH_CACHE['LOCAL_TTL']
+)
+
+
+def get_shared_cache():
+    alias = settings.TOKEN_AUTH_CACHE['SHARED_ALIAS']
+    return caches[alias] if alias else None
+
+
+def make_key(token_key):
+    # Сам токен в ключ кэша не попадает.
+    return CACHE_KEY.format(hashlib.sha256(token_key.encode()).hexdigest())
+
+
+def forget_tokens(*token_keys):
+    """Убирает токены из кэшей после фиксации текущей транзакции."""
+    keys = [make_key(token_key) for token_key in token_keys]
+
+    def delete():
+        for key in keys:
+            local_cache.delete(key)
+        shared = get_shared_cache()
+        if shared is not None:
+            shared.delete_many(keys)
+
+    if keys:
+        transaction.on_commit(delete)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+
+    def authenticate_credentials(self, key):
+        cache_key = make_key(key)
+        user = local_cache.get(cache_key)
+        shared = get_shared_cache()
+        if user is None and shared is not None:
+            user = shared.get(cache_key)
+            if user is not None:
+                local_cache.set(cache_key, user)
+        if user is None:
+            user, _token = super().authenticate_credentials(key)
+            local_cache.set(cache_key, user)
+            if shared is not None:
+                shared.set(
+                    cache_key, user, settings.TOKEN_AUTH_CACHE['SHARED_TTL']
+                )
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.')
+            )
+        # Запрос может менять атрибуты пользователя — отдаём копию.
+        user = copy.copy(user)
+        return user, self.get_model()(key=key, user=user)
@@ -0,0 +1,67 @@
+"""Кэш ответов read-эндпоинтов с инвалидацией по версиям.
+
+Каждый ответ зависит от набора областей (recipes, tags, ingredients).
+У области в кэше хранится версия — время последнего изменения её
+данных; версии входят в ключ ответа, поэтому сигнал об изменении
+модели просто увеличивает версию, и все зависимые ответы перестают
+находиться, не требуя перебора ключей. Работает с любым бэкендом
+Django: locmem в разработке, Redis в production.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+VERSION_KEY = 'response-cache:version:{}'
+RESPONSE_KEY = 'response-cache:{scopes}:{auth}:{digest}'
+
+
+def get_cache():
+    return caches[settings.RESPONSE_CACHE['ALIAS']]
+
+
+def get_versions(scopes):
+    """Версии областей; отсутствующие заводятся текущим временем."""
+    cache = get_cache()
+    keys = {scope: VERSION_KEY.format(scope) for scope in scopes}
+    stored = cache.get_many(keys.values())
+    versions = {}
+    for scope, key in keys.items():
+        if key not in stored:
+            cache.add(key, time.time(), None)
+            stored[key] = cache.get(key)
+        versions[scope] = stored[key]
+    return versions
+
+
+def bump(*scopes):
+    """Меняет версии областей после фиксации текущей транзакции."""
+    def set_versions():
+        get_cache().set_many(
+            {VERSION_KEY.format(scope): time.time() for scope in scopes},
+            None,
+        )
+    transaction.on_commit(set_versions)
+
+
+def user_scope(user_id):
+    """Область данных, видимых только пользователю: избранное и т.п."""
+    return f'user.{user_id}'
+
+
+def get_auth_state(request):
+    return 'auth' if request.user.is_authenticated else 'anon'
+
+
+def make_key(request, scopes):
+    versions = get_versions(scopes)
+    digest = hashlib.sha1(
+        request.build_absolute_uri().encode()
+    ).hexdigest()
+    return RESPONSE_KEY.format(
+        scopes='-'.join(f'{scope}.{versions[scope]}' for scope in scopes),
+        auth=get_auth_state(request),
+        digest=digest,
+    )
@@ -0,0 +1,90 @@
+import csv
+import tempfile
+from html import escape
+
+import pdfkit
+from django.http import StreamingHttpResponse
+
+FILENAME = 'shopping_list'
+
+
+def iter_lines(ingredients):
+    yield 'Список покупок\n\n'
+    for item in ingredients:
+        yield '{} ({}) — {}\n'.format(
+            item['ingredient__name'],
+            item['ingredient__measurement_unit'],
+            item['ingr_amount'],
+        )
+
+
+class Echo:
+    """Буфер для csv.writer, который сразу возвращает записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv_rows(ingredients):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('Ингредиент', 'Единица измерения', 'Количество'))
+    for item in ingredients:
+        yield writer.writerow((
+            item['ingredient__name'],
+            item['ingredient__measurement_unit'],
+            item['ingr_amount'],
+        ))
+
+
+def iter_html(ingredients):
+    yield (
+        '<html><head><meta charset="utf-8"></head><body>'
+        '<h1>Список покупок</h1><table>'
+    )
+    for item in ingredients:
+        yield '<tr><td>{}</td><td>{}</td><td>{}</td></tr>'.format(
+            escape(item['ingredient__name']),
+            escape(item['ingredient__measurement_unit']),
+            item['ingr_amount'],
+        )
+    yield '</table></body></html>'
+
+
+def attachment(response, extension):
+    response['Content-Disposition'] = (
+        f'attachment; filename="{FILENAME}.{extension}"'
+    )
+    return response
+
+
+def export_txt(ingredients):
+    return attachment(StreamingHttpResponse(
+        iter_lines(ingredients), content_type='text/plain; charset=utf-8'
+    ), 'txt')
+
+
+def export_csv(ingredients):
+    return attachment(StreamingHttpResponse(
+        iter_csv_rows(ingredients), content_type='text/csv; charset=utf-8'
+    ), 'csv')
+
+
+def write_pdf(ingredients, path):
+    """Собирает PDF через wkhtmltopdf в файл по пути path.
+
+    wkhtmltopdf работает секунды, поэтому вызывается только из фоновой
+    задачи api.shopping_list_pdf. HTML пишется построчно во временный
+    файл, а не собирается в одну строку.
+    """
+    with tempfile.NamedTemporaryFile(
+        'w', suffix='.html', encoding='utf-8'
+    ) as html:
+        html.writelines(iter_html(ingredients))
+        html.flush()
+        pdfkit.from_file(html.name, path, options={'quiet': ''})
+
+
+EXPORTERS = {
+    'txt': export_txt,
+    'csv': export_csv,
+}
@@ -0,0 +1,79 @@
+import base64
+import binascii
+import hashlib
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from drf_extra_fields.fields import Base64FieldMixin, Base64ImageField
+from PIL import Image, UnidentifiedImageError
+
+
+class StreamingBase64ImageField(Base64ImageField):
+    """Base64ImageField без копии декодированного файла в памяти.
+
+    Строка декодируется порциями во временный файл на диске, по пути
+    считается SHA-256 (он становится именем файла) и проверяются
+    предельный размер RECIPE_IMAGE_MAX_SIZE и число пикселей
+    RECIPE_IMAGE_MAX_PIXELS.
+    """
+    chunk_size = 64 * 1024
+    TOO_LARGE_MESSAGE = 'Изображение больше {} байт.'
+    TOO_MANY_PIXELS_MESSAGE = 'Изображение больше {} пикселей.'
+
+    def to_internal_value(self, base64_data):
+        if base64_data in self.EMPTY_VALUES:
+            return None
+        if not isinstance(base64_data, str):
+            raise ValidationError(self.INVALID_FILE_MESSAGE)
+        payload = base64_data.rpartition(';base64,')[2]
+        max_size = settings.RECIPE_IMAGE_MAX_SIZE
+        if len(payload) // 4 * 3 > max_size + 2:
+            raise ValidationError(self.TOO_LARGE_MESSAGE.format(max_size))
+        upload = TemporaryUploadedFile(
+            'image', 'application/octet-stream', 0, None
+        )
+        digest = hashlib.sha256()
+        try:
+            for start in range(0, len(payload), self.chunk_size):
+                chunk = base64.b64decode(
+                    payload[start:start + self.chunk_size], validate=True
+                )
+                digest.update(chunk)
+                upload.write(chunk)
+            upload.size = upload.tell()
+            if upload.size > max_size:
+                raise ValidationError(
+                    self.TOO_LARGE_MESSAGE.format(max_size)
+                )
+            upload.seek(0)
+            extension = self.get_extension(upload)
+        except (binascii.Error, ValueError):
+            upload.close()
+            raise ValidationError(self.INVALID_FILE_MESSAGE)
+        except ValidationError:
+            upload.close()
+            raise
+        upload.name = f'{digest.hexdigest()}.{extension}'
+        return super(Base64FieldMixin, self).to_internal_value(upload)
+
+    def get_extension(self, upload):
+        """Формат изображения после проверки его ширины × высоты."""
+        max_pixels = settings.RECIPE_IMAGE_MAX_PIXELS
+        try:
+            with Image.open(upload) as image:
+                extension = (image.format or '').lower()
+                pixels = image.width * image.height
+        except Image.DecompressionBombError:
+            pixels = None
+        except (ValueError, UnidentifiedImageError):
+            raise ValidationError(self.INVALID_FILE_MESSAGE)
+        finally:
+            upload.seek(0)
+        if pixels is None or pixels > max_pixels:
+            raise ValidationError(
+                self.TOO_MANY_PIXELS_MESSAGE.format(max_pixels)
+            )
+        if extension not in self.ALLOWED_TYPES:
+            raise ValidationError(self.INVALID_TYPE_MESSAGE)
+        return extension
@@ -1,33 +1,72 @@
+from django.db.models import Exists, OuterRef
 from django_filters import rest_framework as filters
 
-from recipes.models import Ingredient, Recipe, Tag
+from recipes.models import Ingredient, Recipe, RecipeTag, Tag, UserRecipe
+from recipes.search import search_recipes
+
+# Порядки выдачи рецептов по ?ordering=; все обслуживаются индексами.
+ORDERINGS = {
+    'popular': ('-favorites_count', '-pub_date', 'id'),
+}
 
 
 class RecipeFilter(filters.FilterSet):
+    """Фильтры списка рецептов.
+
+    Каждый фильтр по связанной таблице добавляет EXISTS-подзапрос, а не
+    JOIN: рецепты не дублируются и DISTINCT не нужен, а подзапросы
+    обслуживаются составными индексами (tag, recipe) и
+    (user, kind, recipe).
+    """
     tags = filters.ModelMultipleChoiceFilter(
         field_name='tags__slug',
         to_field_name='slug',
-        queryset=Tag.objects.all()
+        queryset=Tag.objects.all(),
+        method='filter_tags',
+    )
+    search = filters.CharFilter(method='filter_search')
+    is_favorited = filters.BooleanFilter(method='filter_is_favorited')
+    is_in_shopping_cart = filters.BooleanFilter(
+        method='filter_is_in_shopping_cart'
+    )
+    ordering = filters.ChoiceFilter(
+        choices=[(name, name) for name in ORDERINGS],
+        method='filter_ordering',
     )
 
     class Meta:
         model = Recipe
-        fields = ['author', 'tags']
+        fields = ['author', 'tags', 'search', 'is_favorited',
+                  'is_in_shopping_cart', 'ordering']
+
+    def filter_ordering(self, queryset, name, value):
+        return queryset.order_by(*ORDERINGS[value])
+
+    def filter_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
+
+    def filter_tags(self, queryset, name, value):
+        if not value:
+            return queryset
+        return queryset.filter(Exists(RecipeTag.objects.filter(
+            recipe=OuterRef('pk'), tag__in=value,
+        )))
 
-    @property
-    def get_queryset(self):
-        queryset = super().qs
+    def filter_user_list(self, queryset, kind, value):
         user = self.request.user
+        if not value:
+            return queryset
+        if user.is_anonymous:
+            return queryset.none()
+        return queryset.filter(Exists(UserRecipe.objects.filter(
+            user=user, kind=kind, recipe=OuterRef('pk'),
+        )))
 
-        for key, value in self.request.query_params.items():
-            if (key == 'is_favorited' and value == '1'
-                    and user.is_authenticated):
-                queryset = queryset.filter(favorites__user=user)
-            if (key == 'is_in_shopping_cart' and value == '1'
-                    and user.is_authenticated):
-                queryset = queryset.filter(shopping_cart__user=user)
+    def filter_is_favorited(self, queryset, name, value):
+        return self.filter_user_list(queryset, UserRecipe.FAVORITE, value)
 
-        return queryset
+    def filter_is_in_shopping_cart(self, queryset, name, value):
+        return self.filter_user_list(queryset, UserRecipe.CART, value)
 
 
 class IngredientFilter(filters.FilterSet):
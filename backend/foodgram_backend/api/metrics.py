@@ -0,0 +1,87 @@
+"""Метрики запроса: SQL, время в базе и в сериализаторах.
+
+Обёртка execute_wrappers ставится на каждое соединение при его
+создании и ничего не делает, пока для текущего запроса не заведён
+RequestMetrics (см. api.middleware.RequestMetricsMiddleware). Объект
+лежит в contextvar, поэтому запросы из sync_to_async под ASGI тоже
+учитываются.
+"""
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+
+current = ContextVar('request_metrics', default=None)
+
+
+class QueryBudgetExceededError(Exception):
+    """View выполнила больше SQL-запросов, чем ей разрешено."""
+
+
+class RequestMetrics:
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.statements = Counter()
+        self.timings = {}
+        self._active = set()
+
+    def add_query(self, sql, duration):
+        self.queries += 1
+        self.db_time += duration
+        self.statements[sql] += 1
+
+    def duplicates(self, threshold):
+        """Одинаковый SQL, выполненный threshold раз и больше, — N+1."""
+        return [
+            (sql, count) for sql, count in self.statements.most_common()
+            if count >= threshold
+        ]
+
+    @contextmanager
+    def measure(self, name):
+        # Вложенные замеры (сериализатор внутри сериализатора) не
+        # суммируются повторно.
+        if name in self._active:
+            yield
+            return
+        self._active.add(name)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = (
+                self.timings.get(name, 0.0) + time.perf_counter() - started
+            )
+            self._active.discard(name)
+
+
+def measure(name):
+    metrics = current.get()
+    return metrics.measure(name) if metrics is not None else nullcontext()
+
+
+def record_query(execute, sql, params, many, context):
+    metrics = current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.add_query(sql, time.perf_counter() - started)
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class TimedSerializerMixin:
+    """Учитывает время to_representation в метрике serialize."""
+
+    def to_representation(self, instance):
+        with measure('serialize'):
+            return super().to_representation(instance)
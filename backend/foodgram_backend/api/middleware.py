@@ -0,0 +1,111 @@
+import asyncio
+import json
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.utils.deprecation import MiddlewareMixin
+
+from .metrics import QueryBudgetExceededError, RequestMetrics, current
+
+logger = logging.getLogger('api.metrics')
+
+
+class RequestMetricsMiddleware(MiddlewareMixin):
+    """Число SQL-запросов, время в базе и в сериализаторах на запрос.
+
+    Замеряется доля SAMPLE_RATE запросов, остальные проходят без
+    накладных расходов. По замеренным запросам пишется строка JSON
+    в логгер api.metrics и, если включён SERVER_TIMING, заголовок
+    Server-Timing. Повторяющийся SQL (DUPLICATE_THRESHOLD раз и больше)
+    попадает в лог как признак N+1.
+
+    В режиме STRICT замеряются все запросы, и превышение бюджета
+    запросов выбрасывает QueryBudgetExceededError — так тесты падают на
+    регрессиях. Бюджет берётся из атрибута query_budget класса view,
+    затем из BUDGETS по имени маршрута, затем QUERY_BUDGET.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.config = settings.REQUEST_METRICS
+
+    def is_sampled(self):
+        return (
+            self.config['STRICT']
+            or random.random() < self.config['SAMPLE_RATE']
+        )
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self):
+            return self.acall(request)
+        if not self.is_sampled():
+            return self.get_response(request)
+        metrics = RequestMetrics()
+        token = current.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            current.reset(token)
+        return self.finish(request, response, metrics)
+
+    async def acall(self, request):
+        if not self.is_sampled():
+            return await self.get_response(request)
+        metrics = RequestMetrics()
+        token = current.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current.reset(token)
+        return self.finish(request, response, metrics)
+
+    def get_view_name(self, request):
+        match = request.resolver_match
+        return match.view_name if match is not None else None
+
+    def get_budget(self, request, view_name):
+        view_class = getattr(
+            getattr(request.resolver_match, 'func', None), 'cls', None
+        )
+        budget = getattr(view_class, 'query_budget', None)
+        if budget is None:
+            budget = self.config['BUDGETS'].get(view_name)
+        if budget is None:
+            budget = self.config['QUERY_BUDGET']
+        return budget
+
+    def finish(self, request, response, metrics):
+        total = time.perf_counter() - metrics.started
+        view_name = self.get_view_name(request)
+        serialize = metrics.timings.get('serialize', 0.0)
+        duplicates = metrics.duplicates(self.config['DUPLICATE_THRESHOLD'])
+        if self.config['SERVER_TIMING']:
+            response['Server-Timing'] = ', '.join((
+                f'db;dur={metrics.db_time * 1000:.1f};'
+                f'desc="{metrics.queries} queries"',
+                f'serialize;dur={serialize * 1000:.1f}',
+                f'total;dur={total * 1000:.1f}',
+            ))
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'view': view_name,
+            'status': response.status_code,
+            'queries': metrics.queries,
+            'db_ms': round(metrics.db_time * 1000, 1),
+            'serialize_ms': round(serialize * 1000, 1),
+            'total_ms': round(total * 1000, 1),
+            'duplicates': [
+                {'sql': sql[:200], 'count': count}
+                for sql, count in duplicates[:3]
+            ],
+        }, ensure_ascii=False))
+        budget = self.get_budget(request, view_name)
+        if self.config['STRICT'] and metrics.queries > budget:
+            raise QueryBudgetExceededError(
+                f'{view_name}: {metrics.queries} SQL-запросов '
+                f'при бюджете {budget}'
+            )
+        return response
@@ -1,7 +1,149 @@
-from rest_framework import mixins, viewsets
+import hashlib
+
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from rest_framework import mixins, status, viewsets
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+
+from .cache import get_cache, get_versions, make_key, user_scope
+from foodgram_backend.routers import replica_reads
+
+
+def add_validators(response, etag, last_modified):
+    if response.status_code in (
+        status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED
+    ):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_vary_headers(response, ('Authorization', ))
+    return response
 
 
 class AbstractGETViewSet(
     viewsets.GenericViewSet, mixins.ListModelMixin, mixins.RetrieveModelMixin
 ):
     pass
+
+
+class ReplicaReadMixin:
+    """Безопасные запросы читают с реплики базы.
+
+    Переключение происходит после аутентификации и проверки прав, так
+    что токен только что вошедшего пользователя ищется в default.
+    """
+    replica_token = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS:
+            self.replica_token = replica_reads.set(True)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if self.replica_token is not None:
+            replica_reads.reset(self.replica_token)
+            self.replica_token = None
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class CachedResponseMixin:
+    """Кэширует сериализованные ответы list и retrieve.
+
+    cache_scopes — области данных, от которых зависит ответ; их версии
+    входят в ключ вместе с адресом, параметрами запроса и тем,
+    авторизован ли пользователь. Если ответ содержит данные конкретного
+    пользователя, cache_anonymous_only оставляет кэш только для анонимов.
+    Время жизни берётся из RESPONSE_CACHE['TIMEOUTS'] по basename.
+    """
+    cache_scopes = ()
+    cache_anonymous_only = False
+
+    def is_cacheable(self, request):
+        return (
+            bool(self.cache_scopes)
+            and request.method == 'GET'
+            and not (
+                self.cache_anonymous_only and request.user.is_authenticated
+            )
+        )
+
+    def cached(self, handler, request, *args, **kwargs):
+        if not self.is_cacheable(request):
+            return handler(request, *args, **kwargs)
+        cache = get_cache()
+        key = make_key(request, self.cache_scopes)
+        data = cache.get(key)
+        if data is not None:
+            response = Response(data)
+            response['X-Cache'] = 'HIT'
+            return response
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(
+                key, response.data,
+                settings.RESPONSE_CACHE['TIMEOUTS'].get(self.basename),
+            )
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached(super().retrieve, request, *args, **kwargs)
+
+
+class ConditionalGetMixin:
+    """ETag и Last-Modified для list и retrieve.
+
+    Валидаторы строятся из версий областей etag_scopes (см. api.cache)
+    и версии личных данных пользователя, а для отдельного объекта — ещё
+    из get_object_modified(). На совпавший If-None-Match или
+    If-Modified-Since отвечает 304, не выполняя запрос к выборке и
+    не сериализуя данные.
+    """
+    etag_scopes = ()
+    object_etag_scopes = None
+
+    def get_object_modified(self):
+        return None
+
+    def get_validators(self, request):
+        scopes = self.etag_scopes
+        if self.action == 'retrieve' and self.object_etag_scopes is not None:
+            scopes = self.object_etag_scopes
+        if request.user.is_authenticated:
+            scopes = (*scopes, user_scope(request.user.id))
+        timestamps = list(get_versions(scopes).values())
+        if self.action == 'retrieve':
+            try:
+                modified = self.get_object_modified()
+            except (TypeError, ValueError):
+                # Некорректный id: 404 ответит get_object() обработчика.
+                modified = None
+            if modified is None:
+                return None, None
+            timestamps.append(modified.timestamp())
+        last_modified = int(max(timestamps))
+        etag = hashlib.sha1(repr((
+            request.build_absolute_uri(), request.user.id, timestamps,
+        )).encode()).hexdigest()
+        return f'"{etag}"', last_modified
+
+    def conditional(self, handler, request, *args, **kwargs):
+        etag, last_modified = self.get_validators(request)
+        if etag is None:
+            return handler(request, *args, **kwargs)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified,
+        )
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        return add_validators(response, etag, last_modified)
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(super().retrieve, request, *args, **kwargs)
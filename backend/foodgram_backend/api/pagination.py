@@ -1,6 +1,72 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+from .filters import ORDERINGS
 
 
 class CustomPagination(PageNumberPagination):
     page_size_query_param = 'limit'
     page_size = 6
+
+
+class RecipeCursorPagination(CursorPagination):
+    page_size_query_param = 'limit'
+    page_size = 6
+    max_page_size = 100
+    ordering = ('-pub_date', 'id')
+
+
+class TrendingPagination(CustomPagination):
+    """Лента trending по номерам страниц.
+
+    Курсор по рейтингу пропускал бы и повторял рецепты: пересчёт по
+    расписанию переписывает рейтинг между запросами страниц.
+    """
+    max_page_size = 100
+
+
+class RecipePagination(CustomPagination):
+    """Постраничная выдача рецептов с необязательным режимом курсоров.
+
+    По умолчанию работает как CustomPagination (page/limit). Параметр
+    ?pagination=cursor или переданный cursor переключает выдачу на
+    keyset-пагинацию по (-pub_date, id): без COUNT и OFFSET, поэтому
+    глубокие страницы стоят столько же, сколько первая. Курсор DRF
+    держится только на первом поле порядка, и оно должно быть
+    уникальным и неизменным; у порядков из ORDERINGS (popular) его нет,
+    поэтому они всегда выдаются по номерам страниц.
+    """
+    mode_query_param = 'pagination'
+    cursor_pagination_class = RecipeCursorPagination
+
+    def __init__(self):
+        self.cursor_paginator = None
+
+    def use_cursor(self, request):
+        if request.query_params.get('ordering') in ORDERINGS:
+            return False
+        return (
+            request.query_params.get(self.mode_query_param) == 'cursor'
+            or self.cursor_pagination_class.cursor_query_param
+            in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_cursor(request):
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class FeedPagination(CursorPagination):
+    """Keyset-пагинация ленты подписок по (дата публикации, id)."""
+    page_size_query_param = 'limit'
+    page_size = 6
+    max_page_size = 100
+    ordering = ('-feed_date', 'id')
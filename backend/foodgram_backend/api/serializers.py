@@ -1,18 +1,50 @@
 import re
 
+from django.db import transaction
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from djoser.serializers import UserCreateSerializer, UserSerializer
-from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers, status
 from rest_framework.exceptions import ValidationError
 from rest_framework.fields import SerializerMethodField
 
-from recipes.models import (Carts, Favorites, Ingredient, IngredientAmount,
-                            Recipe, Tag)
+from .fields import StreamingBase64ImageField
+from .metrics import TimedSerializerMixin
+from jobs.models import Job
+from recipes.images import recipe_image_storage, variant_keys
+from recipes.models import (Ingredient, IngredientAmount, Recipe, RecipeTag,
+                            ShoppingListItem, Tag, UserRecipe)
 from users.models import User
 
 
-class UserSerializer(UserSerializer):
+def get_image_variants(recipe, request):
+    """Ссылки на уменьшенные копии; пока их нет — на оригинал.
+
+    Варианты берутся, только если построены по текущему изображению:
+    после замены картинки старые варианты ей уже не соответствуют.
+    """
+    if not recipe.image:
+        return {}
+    variants = recipe.image_variants
+    if variants.get('source') != recipe.image.name:
+        variants = {}
+    urls = {}
+    for key in variant_keys():
+        name = variants.get(key)
+        url = recipe_image_storage.url(name) if name else recipe.image.url
+        urls[key] = request.build_absolute_uri(url) if request else url
+    return urls
+
+
+def get_recipes_limit(request):
+    try:
+        limit = int(request.query_params['recipes_limit'])
+    except (AttributeError, KeyError, ValueError):
+        return None
+    return max(limit, 0)
+
+
+class UserSerializer(TimedSerializerMixin, UserSerializer):
     is_subscribed = SerializerMethodField(read_only=True)
 
     class Meta:
@@ -21,10 +53,12 @@ class UserSerializer(UserSerializer):
                   'last_name', 'is_subscribed', )
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
-        if self.context.get('request').user.is_anonymous:
+        if not request or request.user.is_anonymous:
             return False
-        return obj.following.filter(user=request.user).exists()
+        return obj.following.filter(follower=request.user).exists()
 
 
 class UserCreateSerializer(UserCreateSerializer):
@@ -37,7 +71,6 @@ class UserCreateSerializer(UserCreateSerializer):
 
 
 class SubscribeListSerializer(UserSerializer):
-    recipes_count = SerializerMethodField()
     recipes = SerializerMethodField()
 
     class Meta(UserSerializer.Meta):
@@ -49,7 +82,7 @@ class SubscribeListSerializer(UserSerializer):
             'request').parser_context.get('kwargs').get('id')
         author = get_object_or_404(User, id=author_id)
         user = self.context.get('request').user
-        if user.follower.filter(author=author_id).exists():
+        if user.follows.filter(author=author_id).exists():
             raise ValidationError(
                 detail='Подписка уже существует',
                 code=status.HTTP_400_BAD_REQUEST,
@@ -61,27 +94,30 @@ class SubscribeListSerializer(UserSerializer):
             )
         return data
 
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
-
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        limit = request.GET.get('recipes_limit')
-        recipes = obj.recipes.all()
-        if limit:
-            recipes = recipes[: int(limit)]
-        serializer = RecipeShortSerializer(recipes, many=True, read_only=True)
+        previews = self.context.get('recipes_by_author')
+        if previews is not None:
+            recipes = previews.get(obj.id, [])
+        else:
+            recipes = Recipe.objects.previews_by_author(
+                [obj.id], get_recipes_limit(self.context.get('request'))
+            )[obj.id]
+        serializer = RecipeShortSerializer(
+            recipes, many=True, read_only=True, context=self.context
+        )
         return serializer.data
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(TimedSerializerMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Tag
         fields = ('id', 'name', 'color', 'slug')
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(
+    TimedSerializerMixin, serializers.ModelSerializer
+):
 
     class Meta:
         model = Ingredient
@@ -89,9 +125,7 @@ class IngredientSerializer(serializers.ModelSerializer):
 
 
 class IngredientAmountSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all()
-    )
+    id = serializers.ReadOnlyField(source='ingredient.id')
     name = serializers.ReadOnlyField(source='ingredient.name')
     measurement_unit = serializers.ReadOnlyField(
         source='ingredient.measurement_unit'
@@ -102,50 +136,68 @@ class IngredientAmountSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount',)
 
 
-class RecipeReadSerializer(serializers.ModelSerializer):
+class IngredientAmountWriteSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField()
+
+    class Meta:
+        model = IngredientAmount
+        fields = ('id', 'amount')
+        extra_kwargs = {'amount': {'required': True, 'allow_null': False}}
+
+
+class RecipeReadSerializer(
+    TimedSerializerMixin, serializers.ModelSerializer
+):
     tags = TagSerializer(read_only=False, many=True)
     author = UserSerializer(read_only=True, many=False)
     ingredients = IngredientAmountSerializer(
         many=True,
-        source='ingredienttorecipe')
+        source='amount')
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
-    image = Base64ImageField(max_length=None)
+    image = StreamingBase64ImageField(max_length=None)
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients',
                   'is_favorited', 'is_in_shopping_cart',
-                  'name', 'image', 'text', 'cooking_time'
+                  'name', 'image', 'image_variants', 'text', 'cooking_time',
+                  'favorites_count', 'carts_count'
                   )
 
+    def get_image_variants(self, obj):
+        return get_image_variants(obj, self.context.get('request'))
+
     def get_ingredients(self, obj):
         ingredients = IngredientAmount.objects.filter(recipe=obj)
         return IngredientAmountSerializer(ingredients, many=True).data
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request')
         if not request or request.user.is_anonymous:
             return False
-        return obj.favorites.filter(user=request.user).exists()
+        return obj.in_lists.favorites().filter(user=request.user).exists()
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request')
         if not request or request.user.is_anonymous:
             return False
-        return obj.shopping_list.filter(user=request.user).exists()
+        return obj.in_lists.carts().filter(user=request.user).exists()
 
 
 class CreateRecipeSerializer(serializers.ModelSerializer):
-    ingredients = IngredientAmountSerializer(
+    ingredients = IngredientAmountWriteSerializer(
         many=True,
     )
-    tags = serializers.PrimaryKeyRelatedField(
-        many=True,
-        queryset=Tag.objects.all(),
-        error_messages={'does_not_exist': 'Указанного тега не существует'}
+    tags = serializers.ListField(
+        child=serializers.IntegerField(),
     )
-    image = Base64ImageField(max_length=None)
+    image = StreamingBase64ImageField(max_length=None)
     author = UserSerializer(read_only=True)
     cooking_time = serializers.IntegerField()
 
@@ -156,11 +208,11 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
             'name', 'image', 'text', 'cooking_time',)
 
     def validate_tags(self, tags):
-        for tag in tags:
-            if not Tag.objects.filter(id=tag.id).exists():
-                raise serializers.ValidationError(
-                    'Указанного тега не существует')
-        return tags
+        tags_by_id = Tag.objects.in_bulk(tags)
+        if len(tags_by_id) != len(set(tags)):
+            raise serializers.ValidationError(
+                'Указанного тега не существует')
+        return [tags_by_id[tag_id] for tag_id in dict.fromkeys(tags)]
 
     def validate_name(self, name):
         if not re.search('[a-zA-Z]', name):
@@ -176,77 +228,133 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
         return cooking_time
 
     def validate_ingredients(self, ingredients):
-        ingredients_list = []
         if not ingredients:
             raise serializers.ValidationError(
                 'Отсутствуют ингридиенты')
+        amounts = {}
         for ingredient in ingredients:
-            if ingredient['id'] in ingredients_list:
+            if ingredient['id'] in amounts:
                 raise serializers.ValidationError(
                     'Ингридиенты должны быть уникальны')
-            ingredients_list.append(ingredient['id'])
-            if int(ingredient.get('amount')) < 1:
+            if ingredient['amount'] < 1:
                 raise serializers.ValidationError(
                     'Количество ингредиента больше 0')
-        return ingredients
+            amounts[ingredient['id']] = ingredient['amount']
+        existing = set(Ingredient.objects.filter(
+            id__in=amounts
+        ).values_list('id', flat=True))
+        if existing != amounts.keys():
+            raise serializers.ValidationError(
+                'Указанного ингредиента не существует: {}'.format(
+                    ', '.join(map(str, sorted(amounts.keys() - existing)))
+                ))
+        return amounts
 
     @staticmethod
-    def create_ingredients(recipe, ingredients):
-        ingredient_liist = []
-        for ingredient_data in ingredients:
-            ingredient_liist.append(
-                IngredientAmountSerializer(
-                    ingredient=ingredient_data.pop('id'),
-                    amount=ingredient_data.pop('amount'),
-                    recipe=recipe,
-                )
+    def create_ingredients(recipe, amounts):
+        IngredientAmount.objects.bulk_create(
+            IngredientAmount(
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount,
             )
-        IngredientAmountSerializer.objects.bulk_create(ingredient_liist)
+            for ingredient_id, amount in amounts.items()
+        )
 
+    @staticmethod
+    def update_ingredients(recipe, amounts):
+        """Меняет только отличающиеся строки IngredientAmount.
+
+        Возвращает прежний состав рецепта {ingredient_id: amount}.
+        """
+        current = {
+            amount.ingredient_id: amount
+            for amount in IngredientAmount.objects.filter(recipe=recipe)
+        }
+        old_amounts = {
+            ingredient_id: amount.amount
+            for ingredient_id, amount in current.items()
+        }
+        IngredientAmount.objects.filter(
+            recipe=recipe, ingredient_id__in=current.keys() - amounts.keys()
+        ).delete()
+        changed = []
+        for ingredient_id, amount in current.items():
+            new_amount = amounts.get(ingredient_id)
+            if new_amount is not None and new_amount != amount.amount:
+                amount.amount = new_amount
+                changed.append(amount)
+        IngredientAmount.objects.bulk_update(changed, ['amount'])
+        CreateRecipeSerializer.create_ingredients(recipe, {
+            ingredient_id: amount
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in current
+        })
+        return old_amounts
+
+    @transaction.atomic
     def create(self, validated_data):
         request = self.context.get('request', None)
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
         recipe = Recipe.objects.create(author=request.user, **validated_data)
-        recipe.tags.set(tags)
+        RecipeTag.objects.bulk_create(
+            RecipeTag(recipe=recipe, tag=tag) for tag in tags
+        )
         self.create_ingredients(recipe, ingredients)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        instance.tags.clear()
-        IngredientAmountSerializer.objects.filter(recipe=instance).delete()
-        instance.tags.set(validated_data.pop('tags'))
-        ingredients = validated_data.pop('ingredients')
-        self.create_ingredients(instance, ingredients)
+        tags = validated_data.pop('tags', None)
+        ingredients = validated_data.pop('ingredients', None)
+        if tags is not None:
+            instance.tags.set(tags)
+        if ingredients is not None:
+            old_amounts = self.update_ingredients(instance, ingredients)
+            ShoppingListItem.objects.change_recipe(
+                instance.id, old_amounts, ingredients
+            )
         return super().update(instance, validated_data)
 
     def to_representation(self, instance):
-        return RecipeReadSerializer(instance, context={
-            'request': self.context.get('request')
-        }).data
+        request = self.context.get('request')
+        return RecipeReadSerializer(
+            Recipe.objects.with_related(request.user).get(pk=instance.pk),
+            context={'request': request}
+        ).data
 
 
-class RecipeShortSerializer(serializers.ModelSerializer):
+class RecipeShortSerializer(
+    TimedSerializerMixin, serializers.ModelSerializer
+):
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
+
+    def get_image_variants(self, obj):
+        return get_image_variants(obj, self.context.get('request'))
 
 
-class FavoriteSerializer(serializers.ModelSerializer):
+class UserRecipeSerializer(serializers.ModelSerializer):
+    """Добавление рецепта в список пользователя вида kind."""
+    kind = None
+    already_added = None
 
     class Meta:
-        model = Favorites
+        model = UserRecipe
         fields = ('user', 'recipe',)
 
     def validate(self, data):
-        user = data['user']
-        if user.favorites.filter(recipe=data['recipe']).exists():
-            raise serializers.ValidationError(
-                'Рецепт уже добавлен в избранное.'
-            )
+        if UserRecipe.objects.filter(
+            user=data['user'], recipe=data['recipe'], kind=self.kind
+        ).exists():
+            raise serializers.ValidationError(self.already_added)
         return data
 
+    def create(self, validated_data):
+        return super().create({**validated_data, 'kind': self.kind})
+
     def to_representation(self, instance):
         return RecipeShortSerializer(
             instance.recipe,
@@ -254,22 +362,38 @@ class FavoriteSerializer(serializers.ModelSerializer):
         ).data
 
 
-class ShoppingCartSerializer(serializers.ModelSerializer):
+class FavoriteSerializer(UserRecipeSerializer):
+    kind = UserRecipe.FAVORITE
+    already_added = 'Рецепт уже добавлен в избранное.'
 
-    class Meta:
-        model = Carts
-        fields = ('user', 'recipe',)
 
-    def validate(self, data):
-        user = data['user']
-        if user.shopping_list.filter(recipe=data['recipe']).exists():
-            raise serializers.ValidationError(
-                'Рецепт уже добавлен в корзину'
-            )
-        return data
+class ShoppingCartSerializer(UserRecipeSerializer):
+    kind = UserRecipe.CART
+    already_added = 'Рецепт уже добавлен в корзину'
 
-    def to_representation(self, instance):
-        return RecipeShortSerializer(
-            instance.recipe,
-            context={'request': self.context.get('request')}
-        ).data
+
+class RecipeIdsSerializer(serializers.Serializer):
+    """Список id рецептов для массовых операций с избранным и корзиной."""
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=100,
+    )
+
+
+class JobSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    download_url = SerializerMethodField()
+
+    class Meta:
+        model = Job
+        fields = (
+            'id', 'name', 'status', 'attempts', 'created_at', 'finished_at',
+            'download_url',
+        )
+
+    def get_download_url(self, obj):
+        if obj.status != Job.DONE or not (obj.result or {}).get('file'):
+            return None
+        return self.context['request'].build_absolute_uri(
+            reverse('jobs-download', args=[obj.pk])
+        )
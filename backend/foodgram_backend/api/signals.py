@@ -0,0 +1,104 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import forget_tokens
+from .cache import bump, user_scope
+from recipes.images import variants_ready
+from recipes.models import (Ingredient, IngredientAmount, Recipe, RecipeTag,
+                            Tag, UserRecipe)
+from recipes.signals import (counters_changed, dataset_seeded,
+                             ingredients_loaded, user_list_added)
+from users.models import Follow, User
+
+# Какие закэшированные области устаревают при изменении модели.
+INVALIDATES = {
+    Recipe: ('recipes', ),
+    IngredientAmount: ('recipes', ),
+    RecipeTag: ('recipes', ),
+    Tag: ('tags', 'recipes'),
+    Ingredient: ('ingredients', 'recipes'),
+}
+
+
+def invalidate_response_cache(sender, **kwargs):
+    bump(*INVALIDATES[sender])
+
+
+# Получатель подключается к каждой модели отдельно: получатель без
+# sender отключил бы быстрое каскадное удаление у всех моделей.
+for model in INVALIDATES:
+    post_save.connect(invalidate_response_cache, sender=model)
+    post_delete.connect(invalidate_response_cache, sender=model)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_tags(sender, action, **kwargs):
+    if action.startswith('post_'):
+        bump('recipes')
+
+
+@receiver(variants_ready)
+def invalidate_recipe_images(sender, **kwargs):
+    bump('recipes')
+
+
+@receiver(counters_changed, sender=Recipe)
+def invalidate_recipe_counters(sender, **kwargs):
+    # Счётчики и порядок ordering=popular видны в списках рецептов.
+    bump('recipes')
+
+
+@receiver(ingredients_loaded)
+def invalidate_ingredients(sender, **kwargs):
+    bump('ingredients')
+
+
+@receiver(dataset_seeded)
+def invalidate_seeded(sender, **kwargs):
+    bump('recipes', 'users', 'tags', 'ingredients')
+
+
+@receiver(post_save, sender=User)
+def invalidate_authors(sender, update_fields=None, **kwargs):
+    # Автор встроен в ответы с рецептами; вход пользователя (last_login)
+    # на них не влияет.
+    if update_fields is None or set(update_fields) != {'last_login'}:
+        bump('recipes', 'users')
+
+
+@receiver(post_delete, sender=User)
+def invalidate_users(sender, **kwargs):
+    bump('users')
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(sender, instance, update_fields=None, **kwargs):
+    # Деактивация и другие изменения пользователя должны сразу
+    # отразиться на request.user.
+    if update_fields is None or set(update_fields) != {'last_login'}:
+        forget_tokens(*Token.objects.filter(
+            user=instance
+        ).values_list('key', flat=True))
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_token(sender, instance, **kwargs):
+    forget_tokens(instance.key)
+
+
+@receiver(post_save, sender=UserRecipe)
+@receiver(post_delete, sender=UserRecipe)
+def invalidate_user_lists(sender, instance, **kwargs):
+    bump(user_scope(instance.user_id))
+
+
+@receiver(user_list_added)
+def invalidate_user_lists_bulk(sender, user_id, **kwargs):
+    bump(user_scope(user_id))
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follows(sender, instance, **kwargs):
+    bump(user_scope(instance.follower_id))
@@ -0,0 +1,30 @@
+import os
+import tempfile
+import uuid
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+
+from .exporters import FILENAME, write_pdf
+from .utils import make_cart_file
+from jobs.queue import task
+from users.models import User
+
+EXPORTS_DIR = 'exports'
+
+
+@task('api.shopping_list_pdf')
+def shopping_list_pdf(user_id):
+    """Сохраняет PDF со списком покупок в хранилище медиафайлов."""
+    user = User.objects.get(pk=user_id)
+    fd, path = tempfile.mkstemp(suffix='.pdf')
+    os.close(fd)
+    try:
+        write_pdf(make_cart_file(user), path)
+        with open(path, 'rb') as pdf:
+            name = default_storage.save(
+                f'{EXPORTS_DIR}/{uuid.uuid4().hex}.pdf', File(pdf)
+            )
+    finally:
+        os.unlink(path)
+    return {'file': name, 'filename': f'{FILENAME}.pdf'}
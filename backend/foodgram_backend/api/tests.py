@@ -0,0 +1,395 @@
+import base64
+import json
+from io import BytesIO
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIHandler
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from .authentication import local_cache
+from .metrics import QueryBudgetExceededError
+from .views import RecipeViewSet, lock_user_lists
+from recipes.models import (Ingredient, IngredientAmount, Recipe, Tag,
+                            UserRecipe)
+from recipes.trending import refresh_scores
+from users.models import User
+
+
+class APITestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = cls.make_user('user')
+        cls.author = cls.make_user('author')
+        cls.tags = [
+            Tag.objects.create(name=f'Тег {n}', color='#ff0000', slug=f't{n}')
+            for n in range(2)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(name=f'Ингредиент {n}',
+                                      measurement_unit='г')
+            for n in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        local_cache.items.clear()
+        self.anonymous = APIClient()
+        self.client = self.authorized(self.user)
+
+    @staticmethod
+    def make_user(name):
+        return User.objects.create_user(
+            email=f'{name}@example.com', username=name, first_name=name,
+            last_name=name, password='Pass-12345',
+        )
+
+    @staticmethod
+    def authorized(user):
+        client = APIClient()
+        token, _ = Token.objects.get_or_create(user=user)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        return client
+
+    def make_recipes(self, count, author=None):
+        recipes = Recipe.objects.bulk_create(
+            Recipe(
+                author=author or self.author, name=f'Рецепт {n}',
+                text='Описание', cooking_time=10, image='recipes/test.png',
+            )
+            for n in range(count)
+        )
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe=recipe, tag=tag)
+            for recipe in recipes for tag in self.tags
+        )
+        IngredientAmount.objects.bulk_create(
+            IngredientAmount(
+                recipe=recipe, ingredient=ingredient, amount=n + 1
+            )
+            for recipe in recipes
+            for n, ingredient in enumerate(self.ingredients)
+        )
+        return recipes
+
+
+class RecipeListQueriesTest(APITestCase):
+    """Число запросов списка рецептов не зависит от размера страницы."""
+
+    def count_queries(self, client, size):
+        cache.clear()
+        local_cache.items.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get('/api/recipes/', {'limit': size})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), size)
+        return len(queries)
+
+    def test_constant_queries(self):
+        for name, client in (
+            ('anonymous', self.anonymous), ('authorized', self.client)
+        ):
+            with self.subTest(name):
+                Recipe.objects.all().delete()
+                counts = []
+                for size in (1, 10, 100):
+                    self.make_recipes(size - Recipe.objects.count())
+                    counts.append(self.count_queries(client, size))
+                self.assertEqual(counts, [counts[0]] * 3)
+
+
+class RecipeWriteTest(APITestCase):
+    image = (
+        'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABAgMAAABieywa'
+        'AAAACVBMVEUAAAD///9fX1/S0ecCAAAACXBIWXMAAA7EAAAOxAGVKw4bAAAACklEQV'
+        'QImWNoAAAAggCByxOyYQAAAABJRU5ErkJggg=='
+    )
+
+    @staticmethod
+    def png(width, height):
+        buffer = BytesIO()
+        Image.new('1', (width, height)).save(buffer, 'PNG')
+        return 'data:image/png;base64,' + base64.b64encode(
+            buffer.getvalue()
+        ).decode()
+
+    def post_recipe(self, amount, image=None):
+        return self.client.post('/api/recipes/', {
+            'name': 'Soup', 'text': 'Описание', 'cooking_time': 10,
+            'image': image or self.image, 'tags': [self.tags[0].id],
+            'ingredients': [{'id': self.ingredients[0].id, 'amount': amount}],
+        }, format='json')
+
+    def test_amount_within_model_bounds(self):
+        response = self.post_recipe(20)
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['ingredients'][0]['amount'], 20)
+
+    def test_amount_out_of_bounds(self):
+        for amount in (0, 21, 40000, None):
+            with self.subTest(amount=amount):
+                response = self.post_recipe(amount)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('ingredients', response.data)
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_image_pixels_limit(self):
+        image = self.png(20, 20)
+        with override_settings(RECIPE_IMAGE_MAX_PIXELS=399):
+            self.assertIn('image', self.post_recipe(1, image).data)
+        # Декомпрессионная бомба по меркам PIL — тоже ошибка поля.
+        with mock.patch.object(Image, 'MAX_IMAGE_PIXELS', 100):
+            self.assertIn('image', self.post_recipe(1, image).data)
+        self.assertFalse(Recipe.objects.exists())
+        self.assertEqual(self.post_recipe(1, image).status_code, 201)
+
+    def test_variants_of_current_image_only(self):
+        current, stale = self.make_recipes(2)
+        for recipe, source in (
+            (current, 'recipes/test.png'), (stale, 'recipes/old.png')
+        ):
+            Recipe.objects.filter(pk=recipe.pk).update(image_variants={
+                'source': source, 'thumbnail': 'recipes/variants/t.png',
+            })
+        data = self.anonymous.get(f'/api/recipes/{current.id}/').data
+        self.assertTrue(
+            data['image_variants']['thumbnail'].endswith('variants/t.png')
+        )
+        data = self.anonymous.get(f'/api/recipes/{stale.id}/').data
+        self.assertEqual(
+            set(data['image_variants'].values()), {data['image']}
+        )
+
+
+class ConditionalGetTest(APITestCase):
+
+    def test_invalid_pk_is_not_found(self):
+        for url in ('/api/recipes/abc/', '/api/users/abc/'):
+            with self.subTest(url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 404)
+
+    def test_not_modified(self):
+        recipe, = self.make_recipes(1)
+        url = f'/api/recipes/{recipe.id}/'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(
+            url, HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_counters_change_etag(self):
+        recipe, = self.make_recipes(1)
+        other = self.authorized(self.make_user('other'))
+        for url in (f'/api/recipes/{recipe.id}/', '/api/recipes/'):
+            with self.subTest(url):
+                etag = self.client.get(url)['ETag']
+                with self.captureOnCommitCallbacks(execute=True):
+                    other.post(f'/api/recipes/{recipe.id}/favorite/')
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                recipe.refresh_from_db()
+                data = response.data
+                if 'results' in data:
+                    data, = data['results']
+                self.assertEqual(
+                    data['favorites_count'], recipe.favorites_count
+                )
+                other.delete(f'/api/recipes/{recipe.id}/favorite/')
+
+
+class ShoppingListExportTest(APITestCase):
+    """Выгрузка списка покупок через ASGI-обработчик, как под uvicorn."""
+
+    def asgi_get(self, path, query_string):
+        token, _ = Token.objects.get_or_create(user=self.user)
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            messages.append(message)
+
+        async_to_sync(ASGIHandler())({
+            'type': 'http', 'asgi': {'version': '3.0'},
+            'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+            'path': path, 'root_path': '', 'query_string': query_string,
+            'headers': [
+                (b'host', b'testserver'),
+                (b'authorization', f'Token {token.key}'.encode()),
+            ],
+            'server': ('testserver', 80), 'client': ('127.0.0.1', 1),
+        }, receive, send)
+        status = messages[0]['status']
+        body = b''.join(message.get('body', b'') for message in messages[1:])
+        return status, body.decode()
+
+    def test_export_through_asgi(self):
+        for recipe in self.make_recipes(2):
+            UserRecipe.objects.create(
+                user=self.user, recipe=recipe, kind=UserRecipe.CART
+            )
+        path = '/api/recipes/download_shopping_cart/'
+        status, body = self.asgi_get(path, b'type=txt')
+        self.assertEqual(status, 200)
+        self.assertEqual(body.splitlines(), [
+            'Список покупок', '',
+            'Ингредиент 0 (г) — 2',
+            'Ингредиент 1 (г) — 4',
+            'Ингредиент 2 (г) — 6',
+        ])
+        status, body = self.asgi_get(path, b'type=csv')
+        self.assertEqual(status, 200)
+        self.assertEqual(len(body.splitlines()), 4)
+
+
+class RecipePaginationTest(APITestCase):
+
+    def test_cursor_pages(self):
+        recipes = self.make_recipes(5)
+        url, seen = '/api/recipes/?pagination=cursor&limit=2', []
+        while url:
+            data = self.anonymous.get(url).data
+            self.assertNotIn('count', data)
+            seen += [recipe['id'] for recipe in data['results']]
+            url = data['next']
+        self.assertCountEqual(seen, [recipe.id for recipe in recipes])
+
+    def test_popular_uses_page_numbers(self):
+        first, second, third = self.make_recipes(3)
+        Recipe.objects.filter(pk=second.pk).update(favorites_count=2)
+        Recipe.objects.filter(pk=third.pk).update(favorites_count=1)
+        response = self.anonymous.get(
+            '/api/recipes/',
+            {'ordering': 'popular', 'pagination': 'cursor', 'limit': 2},
+        )
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual(
+            [recipe['id'] for recipe in response.data['results']],
+            [second.id, third.id],
+        )
+        self.assertIn('page=2', response.data['next'])
+
+    def test_trending_uses_page_numbers(self):
+        first, second, third = self.make_recipes(3)
+        for user in (self.user, self.author):
+            UserRecipe.objects.create(
+                user=user, recipe=second, kind=UserRecipe.FAVORITE
+            )
+        for recipe in (first, second):
+            UserRecipe.objects.create(
+                user=self.user, recipe=recipe, kind=UserRecipe.CART
+            )
+        refresh_scores()
+        response = self.anonymous.get('/api/recipes/trending/', {'limit': 1})
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(response.data['results'][0]['id'], second.id)
+        response = self.anonymous.get(response.data['next'])
+        self.assertEqual(response.data['results'][0]['id'], first.id)
+        self.assertIsNone(response.data['next'])
+
+
+class UserListBulkTest(APITestCase):
+
+    def test_single_changes_take_user_lock(self):
+        recipe, = self.make_recipes(1)
+        with mock.patch(
+            'api.views.lock_user_lists', wraps=lock_user_lists
+        ) as lock:
+            for name in ('favorite', 'shopping_cart'):
+                url = f'/api/recipes/{recipe.id}/{name}/'
+                with self.subTest(name):
+                    self.assertEqual(self.client.post(url).status_code, 201)
+                    self.assertEqual(self.client.post(url).status_code, 400)
+                    self.assertEqual(
+                        self.client.delete(url).status_code, 204
+                    )
+        self.assertEqual(lock.call_count, 6)
+        recipe.refresh_from_db()
+        self.assertEqual((recipe.favorites_count, recipe.carts_count), (0, 0))
+        self.assertFalse(self.user.shopping_list_items.exists())
+
+    def test_add_and_remove(self):
+        first, second = self.make_recipes(2)
+        url = '/api/recipes/shopping_cart/'
+        self.client.post(url, {'ids': [first.id]}, format='json')
+        response = self.client.post(
+            url, {'ids': [first.id, second.id, 10 ** 6]}, format='json'
+        )
+        self.assertEqual(response.data['results'], [
+            {'id': first.id, 'status': 'exists'},
+            {'id': second.id, 'status': 'added'},
+            {'id': 10 ** 6, 'status': 'not_found'},
+        ])
+        first.refresh_from_db()
+        self.assertEqual(first.carts_count, 1)
+        self.assertEqual(
+            self.user.shopping_list_items.get(
+                ingredient=self.ingredients[0]
+            ).amount,
+            2,
+        )
+        response = self.client.delete(
+            url, {'ids': [first.id, second.id]}, format='json'
+        )
+        self.assertEqual(
+            [item['status'] for item in response.data['results']],
+            ['removed', 'removed'],
+        )
+        self.assertFalse(self.user.shopping_list_items.exists())
+
+
+class RequestMetricsTest(APITestCase):
+    """Режим STRICT: бюджет SQL-запросов и заголовок Server-Timing."""
+
+    def strict(self, **config):
+        return override_settings(REQUEST_METRICS={
+            'SAMPLE_RATE': 0, 'SERVER_TIMING': True, 'STRICT': True,
+            'QUERY_BUDGET': 20, 'BUDGETS': {}, 'DUPLICATE_THRESHOLD': 3,
+            **config,
+        })
+
+    def test_server_timing(self):
+        self.make_recipes(2)
+        with self.strict(), self.assertLogs('api.metrics') as logs:
+            response = APIClient().get('/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(
+            response['Server-Timing'],
+            r'^db;dur=[\d.]+;desc="\d+ queries", '
+            r'serialize;dur=[\d.]+, total;dur=[\d.]+$',
+        )
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(line['view'], 'recipes-list')
+        self.assertGreater(line['queries'], 0)
+
+    def test_budget_exceeded(self):
+        self.make_recipes(2)
+        with self.strict(QUERY_BUDGET=1), self.assertLogs('api.metrics'):
+            with self.assertRaisesMessage(
+                QueryBudgetExceededError, 'recipes-list'
+            ):
+                APIClient().get('/api/recipes/')
+
+    def test_budget_overrides(self):
+        self.make_recipes(2)
+        for config, view_budget in (
+            ({'BUDGETS': {'recipes-list': 20}}, None),
+            ({}, 20),
+        ):
+            with self.subTest(config=config, view_budget=view_budget):
+                cache.clear()
+                with self.strict(QUERY_BUDGET=1, **config), mock.patch.object(
+                    RecipeViewSet, 'query_budget', view_budget, create=True
+                ), self.assertLogs('api.metrics'):
+                    response = APIClient().get('/api/recipes/')
+                self.assertEqual(response.status_code, 200)
@@ -1,8 +1,10 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
+from . import async_views
 from .views import UserViewSet
-from api.views import IngredientViewSet, RecipeViewSet, TagViewSet
+from api.views import IngredientViewSet, JobViewSet, RecipeViewSet, TagViewSet
 
 router = DefaultRouter()
 
@@ -10,7 +12,16 @@ router.register('users', UserViewSet, basename='users')
 router.register('tags', TagViewSet, basename='tags')
 router.register('recipes', RecipeViewSet, basename='recipes')
 router.register('ingredients', IngredientViewSet, basename='ingredients')
+router.register('jobs', JobViewSet, basename='jobs')
 
 urlpatterns = [
     path('', include(router.urls)),
 ]
+
+if settings.ASYNC_READ_PATH:
+    urlpatterns = [
+        path('recipes/', async_views.recipe_list),
+        path('recipes/<int:pk>/', async_views.recipe_detail),
+        path('tags/', async_views.tag_list),
+        path('ingredients/', async_views.ingredient_list),
+    ] + urlpatterns
@@ -1,18 +1,19 @@
-# flake8: noqa
+from django.db.models import F
 
-from django.db.models import Sum
-
-from recipes.models import IngredientAmount
+from recipes.models import ShoppingListItem
 from users.models import User
 
 
 def make_cart_file(user: User):
+    """Список покупок пользователя из материализованной таблицы.
 
-    ingredients = IngredientAmount.objects.filter(
-        recipe__in=user.shopping_cart.all()
-    ).values(
-        'ingredient__name', 'ingredient__measurement_unit'
-    ).order_by('ingredient__name').annotate(
-        ingr_amount=Sum('amount')
-    )
-    return ingredients
+    Суммы уже посчитаны в ShoppingListItem, поэтому выгрузка — одно
+    чтение по индексу (user, ingredient). Строки читаются сразу: под
+    ASGI тело StreamingHttpResponse перебирается в цикле событий, где
+    синхронные запросы к базе запрещены. Строк не больше, чем
+    ингредиентов в корзине.
+    """
+    return list(ShoppingListItem.objects.filter(user=user).values(
+        'ingredient__name', 'ingredient__measurement_unit',
+        ingr_amount=F('amount'),
+    ).order_by('ingredient__name'))
@@ -1,122 +1,292 @@
-from django.db.models import Sum
+from urllib.parse import unquote
+
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F, Value
+from django.http import FileResponse
 from django.shortcuts import get_object_or_404
+from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import (IsAuthenticated,
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.permissions import (AllowAny, IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
-from .mixins import AbstractGETViewSet
-from urllib.parse import unquote
-from rest_framework.permissions import AllowAny
 
-from .pagination import CustomPagination
+from .exporters import EXPORTERS
+from .filters import RecipeFilter
+from .mixins import (AbstractGETViewSet, CachedResponseMixin,
+                     ConditionalGetMixin, ReplicaReadMixin)
+from .pagination import (CustomPagination, FeedPagination, RecipePagination,
+                         TrendingPagination)
 from .serializers import (CreateRecipeSerializer, FavoriteSerializer,
-                          IngredientSerializer, RecipeReadSerializer,
+                          IngredientSerializer, JobSerializer,
+                          RecipeIdsSerializer, RecipeReadSerializer,
                           ShoppingCartSerializer, SubscribeListSerializer,
-                          TagSerializer, UserSerializer)
-from recipes.models import (Carts, Favorites, Ingredient, IngredientAmount,
-                            Recipe, Tag)
+                          TagSerializer, UserSerializer, get_recipes_limit)
+from .utils import make_cart_file
+from jobs.models import Job
+from jobs.queue import enqueue
+from recipes.autocomplete import ingredient_index
+from recipes.feed import feed_queryset
+from recipes.models import Ingredient, Recipe, Tag, UserRecipe
+from recipes.signals import user_list_added
 from users.models import Follow, User
 
 
-class IngredientViewSet(AbstractGETViewSet):
+def lock_user_lists(user):
+    """Блокирует строку пользователя до конца транзакции.
+
+    Все изменения избранного и корзины пользователя, одиночные и
+    массовые, выполняются по очереди: иначе одновременные запросы
+    (двойной клик) добавили бы рецепт в счётчики и список покупок
+    дважды.
+    """
+    User.objects.select_for_update().only('pk').get(pk=user.pk)
+
+
+class IngredientViewSet(
+    ReplicaReadMixin, CachedResponseMixin, AbstractGETViewSet
+):
+    cache_scopes = ('ingredients', )
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
+    autocomplete_limit = 50
 
-    def get_queryset(self):
-        queryset = self.queryset
-        name = self.request.query_params.get('name')
+    def get_limit(self, name):
+        try:
+            limit = int(self.request.query_params['limit'])
+        except (KeyError, ValueError):
+            return self.autocomplete_limit if name else None
+        return max(limit, 1)
 
-        if name:
-            if name[0] == '%':
-                name = unquote(name)
-            name = name.lower()
-        return list(queryset.filter(name__istartswith=name))
+    def autocomplete(self, request, *args, **kwargs):
+        name = request.query_params.get('name', '')
+        if name.startswith('%'):
+            name = unquote(name)
+        ingredients = ingredient_index.search(name, self.get_limit(name))
+        return Response(self.get_serializer(ingredients, many=True).data)
 
+    def list(self, request, *args, **kwargs):
+        return self.cached(self.autocomplete, request, *args, **kwargs)
 
-class TagViewSet(viewsets.ModelViewSet):
+
+class TagViewSet(CachedResponseMixin, viewsets.ModelViewSet):
+    cache_scopes = ('tags', )
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (IsAuthenticatedOrReadOnly, )
     pagination_class = None
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(
+    ReplicaReadMixin, ConditionalGetMixin, CachedResponseMixin,
+    viewsets.ModelViewSet
+):
+    cache_scopes = ('recipes', )
+    cache_anonymous_only = True
+    etag_scopes = ('recipes', )
+    object_etag_scopes = ('tags', 'ingredients', 'users')
     queryset = Recipe.objects.all()
-    # pagination_class = CustomPagination
+    pagination_class = RecipePagination
+    filter_backends = (DjangoFilterBackend, )
+    filterset_class = RecipeFilter
     permission_classes = [AllowAny, ]
 
+    def get_queryset(self):
+        return Recipe.objects.with_related(self.request.user)
+
+    def get_object_modified(self):
+        return Recipe.objects.filter(pk=self.kwargs['pk']).values_list(
+            'updated_at', flat=True
+        ).first()
+
     def get_serializer_class(self):
         if self.request.method == 'GET':
             return RecipeReadSerializer
         return CreateRecipeSerializer
 
     @action(detail=False, methods=['GET'])
+    def trending(self, request):
+        """Рецепты по рейтингу RecipeScore, один запрос на страницу."""
+        queryset = self.filter_queryset(self.get_queryset()).filter(
+            score__isnull=False
+        ).annotate(trending_score=F('score__score')).order_by(
+            '-trending_score', 'id'
+        )
+        paginator = TrendingPagination()
+        page = paginator.paginate_queryset(queryset, request, self)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(
+        detail=False,
+        methods=['GET'],
+        permission_classes=[IsAuthenticated])
+    def feed(self, request):
+        """Рецепты авторов из подписок, новые сверху."""
+        queryset = feed_queryset(
+            self.filter_queryset(self.get_queryset()), request.user
+        )
+        paginator = FeedPagination()
+        page = paginator.paginate_queryset(queryset, request, self)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(
+        detail=False,
+        methods=['GET'],
+        permission_classes=[IsAuthenticated])
     def download_shopping_cart(self, request):
-        ingredients = IngredientAmount.objects.filter(
-            recipe__shopping_list__user=request.user
-        ).order_by('ingredient__name').values(
-            'ingredient__name', 'ingredient__measurement_unit'
-        ).annotate(amount=Sum('amount'))
-        return self.send_message(ingredients)
+        file_type = request.query_params.get('type', 'txt')
+        if file_type == 'pdf':
+            job = enqueue(
+                'api.shopping_list_pdf', {'user_id': request.user.id},
+                user=request.user,
+            )
+            return Response(
+                JobSerializer(job, context={'request': request}).data,
+                status=status.HTTP_202_ACCEPTED,
+            )
+        if file_type not in EXPORTERS:
+            raise ValidationError({'type': 'Доступные форматы: {}'.format(
+                ', '.join([*EXPORTERS, 'pdf'])
+            )})
+        return EXPORTERS[file_type](make_cart_file(request.user))
+
+    def change_user_list(self, request, kind):
+        """Добавляет в список kind или убирает из него рецепты по ids.
+
+        Существование рецептов и их наличие в списке проверяются двумя
+        запросами на весь список, вставка — одним bulk_create, под
+        блокировкой lock_user_lists. Для каждого id возвращается статус:
+        added/exists, removed/absent или not_found.
+        """
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = list(dict.fromkeys(serializer.validated_data['ids']))
+        found = set(Recipe.objects.filter(pk__in=ids).values_list(
+            'id', flat=True
+        ))
+        with transaction.atomic():
+            lock_user_lists(request.user)
+            entries = UserRecipe.objects.filter(user=request.user, kind=kind)
+            present = set(entries.filter(recipe_id__in=found).values_list(
+                'recipe_id', flat=True
+            ))
+            if request.method == 'POST':
+                changed, statuses = found - present, ('added', 'exists')
+                UserRecipe.objects.bulk_create(
+                    [
+                        UserRecipe(
+                            user=request.user, recipe_id=recipe_id, kind=kind
+                        )
+                        for recipe_id in changed
+                    ],
+                    ignore_conflicts=True,
+                )
+                # bulk_create не отправляет post_save: счётчики, список
+                # покупок и кэш обновляют получатели user_list_added.
+                user_list_added.send(
+                    sender=UserRecipe, kind=kind, user_id=request.user.id,
+                    recipe_ids=changed,
+                )
+            else:
+                changed, statuses = present, ('removed', 'absent')
+                entries.filter(recipe_id__in=changed).delete()
+        return Response({'results': [
+            {
+                'id': recipe_id,
+                'status': (
+                    'not_found' if recipe_id not in found
+                    else statuses[recipe_id not in changed]
+                ),
+            }
+            for recipe_id in ids
+        ]})
+
+    @action(
+        detail=False,
+        methods=('POST', 'DELETE'),
+        url_path='shopping_cart',
+        permission_classes=[IsAuthenticated])
+    def shopping_cart_bulk(self, request):
+        return self.change_user_list(request, UserRecipe.CART)
+
+    @action(
+        detail=False,
+        methods=('POST', 'DELETE'),
+        url_path='favorite',
+        permission_classes=[IsAuthenticated])
+    def favorite_bulk(self, request):
+        return self.change_user_list(request, UserRecipe.FAVORITE)
+
+    def add_to_user_list(self, request, pk, serializer_class):
+        # Проверка «уже в списке» и вставка — под той же блокировкой,
+        # что и у массовых изменений.
+        recipe = get_object_or_404(Recipe, id=pk)
+        serializer = serializer_class(
+            data={'user': request.user.id, 'recipe': recipe.id},
+            context={'request': request},
+        )
+        with transaction.atomic():
+            lock_user_lists(request.user)
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    def remove_from_user_list(self, request, pk, entries):
+        recipe = get_object_or_404(Recipe, id=pk)
+        with transaction.atomic():
+            lock_user_lists(request.user)
+            get_object_or_404(
+                entries, user=request.user, recipe=recipe
+            ).delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
         detail=True,
         methods=('POST',),
         permission_classes=[IsAuthenticated])
     def shopping_cart(self, request, pk):
-        context = {'request': request}
-        recipe = get_object_or_404(Recipe, id=pk)
-        data = {
-            'user': request.user.id,
-            'recipe': recipe.id
-        }
-        serializer = ShoppingCartSerializer(data=data, context=context)
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return self.add_to_user_list(request, pk, ShoppingCartSerializer)
 
     @shopping_cart.mapping.delete
     def destroy_shopping_cart(self, request, pk):
-        get_object_or_404(
-            Carts,
-            user=request.user.id,
-            recipe=get_object_or_404(Recipe, id=pk)
-        ).delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
+        return self.remove_from_user_list(
+            request, pk, UserRecipe.objects.carts()
+        )
 
     @action(
         detail=True,
         methods=('POST',),
         permission_classes=[IsAuthenticated])
     def favorite(self, request, pk):
-        context = {"request": request}
-        recipe = get_object_or_404(Recipe, id=pk)
-        data = {
-            'user': request.user.id,
-            'recipe': recipe.id
-        }
-        serializer = FavoriteSerializer(data=data, context=context)
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return self.add_to_user_list(request, pk, FavoriteSerializer)
 
     @favorite.mapping.delete
     def destroy_favorite(self, request, pk):
-        get_object_or_404(
-            Favorites,
-            user=request.user,
-            recipe=get_object_or_404(Recipe, id=pk)
-        ).delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
+        return self.remove_from_user_list(
+            request, pk, UserRecipe.objects.favorites()
+        )
 
 
-class UserViewSet(UserViewSet):
+class UserViewSet(ConditionalGetMixin, UserViewSet):
+    etag_scopes = ('users', )
     queryset = User.objects.all()
     serializer_class = UserSerializer
     pagination_class = CustomPagination
 
+    def get_queryset(self):
+        return super().get_queryset().with_is_subscribed(self.request.user)
+
+    def get_object_modified(self):
+        # Пользователь без метки изменения: хватает версии области users.
+        return User.objects.filter(pk=self.kwargs['id']).values_list(
+            'date_joined', flat=True
+        ).first()
+
     @action(
         detail=True,
         methods=['post', 'delete'],
@@ -131,21 +301,46 @@ class UserViewSet(UserViewSet):
                 author, data=request.data, context={'request': request}
             )
             serializer.is_valid(raise_exception=True)
-            Follow.objects.create(user=user, author=author)
+            Follow.objects.create(follower=user, author=author)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-        if request.method == 'DELETE':
-            get_object_or_404(
-                Follow, user=user, author=author
-            ).delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
+        get_object_or_404(
+            Follow, follower=user, author=author
+        ).delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=False, permission_classes=[IsAuthenticated])
     def subscriptions(self, request):
-        user = request.user
-        queryset = User.objects.filter(following__user=user)
+        queryset = User.objects.filter(
+            following__follower=request.user
+        ).annotate(is_subscribed=Value(True)).order_by('id')
         pages = self.paginate_queryset(queryset)
+        context = self.get_serializer_context()
+        context['recipes_by_author'] = Recipe.objects.previews_by_author(
+            [author.id for author in pages], get_recipes_limit(request)
+        )
         serializer = SubscribeListSerializer(
-            pages, many=True, context={'request': request}
+            pages, many=True, context=context
         )
         return self.get_paginated_response(serializer.data)
+
+
+class JobViewSet(viewsets.ReadOnlyModelViewSet):
+    """Статус фоновых задач текущего пользователя и их результат."""
+    serializer_class = JobSerializer
+    permission_classes = (IsAuthenticated,)
+    pagination_class = CustomPagination
+
+    def get_queryset(self):
+        return Job.objects.filter(user=self.request.user)
+
+    @action(detail=True, methods=['GET'])
+    def download(self, request, pk):
+        job = self.get_object()
+        if job.status != Job.DONE or not (job.result or {}).get('file'):
+            raise NotFound('Файл ещё не готов.')
+        return FileResponse(
+            default_storage.open(job.result['file']),
+            as_attachment=True,
+            filename=job.result.get('filename'),
+        )
@@ -0,0 +1,51 @@
+"""Чтение с реплик базы.
+
+Реплики — базы с алиасом replica_*, их заводит settings.py по
+DB_REPLICA_HOSTS. На реплику уходят только чтения внутри use_replica():
+его включают для безопасных методов view с api.mixins.ReplicaReadMixin.
+Всё остальное, включая чтения внутри транзакции, идёт в default, так
+что отставание реплики не влияет на проверки при записи.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+replica_reads = ContextVar('replica_reads', default=False)
+
+
+@contextmanager
+def use_replica(enabled=True):
+    token = replica_reads.set(enabled)
+    try:
+        yield
+    finally:
+        replica_reads.reset(token)
+
+
+def get_replicas():
+    return [alias for alias in settings.DATABASES
+            if alias.startswith('replica')]
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        if not replica_reads.get():
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        replicas = get_replicas()
+        return random.choice(replicas) if replicas else None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и default.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return False if db in get_replicas() else None
@@ -15,7 +15,7 @@ CSRF_TRUSTED_ORIGINS = [
     'http://62.84.120.186/'
 ]
 
-DEBUG = True
+DEBUG = os.getenv('DEBUG', 'False') == 'True'
 
 ALLOWED_HOSTS = [
     '127.0.0.1',
@@ -33,6 +33,7 @@ INSTALLED_APPS = [
     'recipes',
     'api',
     'users',
+    'jobs',
     'rest_framework',
     'rest_framework.authtoken',
     'djoser',
@@ -42,6 +43,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -72,14 +74,133 @@ TEMPLATES = [
 WSGI_APPLICATION = 'foodgram_backend.wsgi.application'
 
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+# Без POSTGRES_DB — локальный SQLite. CONN_MAX_AGE держит соединение
+# между запросами, CONN_HEALTH_CHECKS проверяет его перед повторным
+# использованием. DB_PGBOUNCER=True — для pgbouncer в режиме transaction
+# pooling: серверные курсоры между транзакциями там не живут.
+# DB_REPLICA_HOSTS — реплики через запятую, на них уходят GET-запросы
+# рецептов и ингредиентов (foodgram_backend.routers).
+if os.getenv('POSTGRES_DB'):
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('POSTGRES_DB'),
+            'USER': os.getenv('POSTGRES_USER', 'postgres'),
+            'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
+            'HOST': os.getenv('DB_HOST', 'database'),
+            'PORT': os.getenv('DB_PORT', 5432),
+            'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+            'DISABLE_SERVER_SIDE_CURSORS': (
+                os.getenv('DB_PGBOUNCER', 'False') == 'True'
+            ),
+        }
     }
+    for number, host in enumerate(
+        filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(','))
+    ):
+        DATABASES[f'replica_{number}'] = {
+            **DATABASES['default'],
+            'HOST': host.strip(),
+            'TEST': {'MIRROR': 'default'},
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        }
+    }
+
+DATABASE_ROUTERS = ['foodgram_backend.routers.ReplicaRouter']
+
+
+REDIS_URL = os.getenv('REDIS_URL')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+RESPONSE_CACHE = {
+    'ALIAS': 'default',
+    'TIMEOUTS': {
+        'recipes': int(os.getenv('RECIPES_CACHE_TIMEOUT', 60)),
+        'tags': int(os.getenv('TAGS_CACHE_TIMEOUT', 60 * 60)),
+        'ingredients': int(os.getenv('INGREDIENTS_CACHE_TIMEOUT', 60 * 60)),
+    },
 }
 
+# Рейтинг /api/recipes/trending/ (recipes.trending): добавления за
+# WINDOW_DAYS дней, затухающие с возрастом рецепта; пересчёт раз в
+# REFRESH_INTERVAL секунд задачей recipes.refresh_scores.
+RECIPE_SCORES = {
+    'WINDOW_DAYS': int(os.getenv('RECIPE_SCORES_WINDOW_DAYS', 7)),
+    'FAVORITE_WEIGHT': 2,
+    'CART_WEIGHT': 1,
+    'GRAVITY': 1.5,
+    'REFRESH_INTERVAL': int(os.getenv('RECIPE_SCORES_REFRESH_INTERVAL', 5 * 60)),
+}
 
+# Очередь фоновых задач (jobs): завершённые задачи и файлы их
+# результатов хранятся RETENTION_DAYS дней, их удаляет задача
+# jobs.prune раз в PRUNE_INTERVAL секунд.
+JOBS = {
+    'RETENTION_DAYS': int(os.getenv('JOBS_RETENTION_DAYS', 7)),
+    'PRUNE_INTERVAL': int(os.getenv('JOBS_PRUNE_INTERVAL', 60 * 60)),
+}
+
+# Лента подписок (recipes.feed): рецепты авторов с FANOUT_LIMIT
+# подписчиков и больше не раскладываются по лентам, а читаются при
+# запросе; при подписке в ленту попадают BACKFILL последних рецептов.
+FEED = {
+    'FANOUT_LIMIT': int(os.getenv('FEED_FANOUT_LIMIT', 5000)),
+    'BACKFILL': int(os.getenv('FEED_BACKFILL', 100)),
+}
+
+# Кэш пользователей по токену для api.authentication: LRU в процессе
+# и, если задан SHARED_ALIAS, общий кэш (Redis) для всех воркеров.
+TOKEN_AUTH_CACHE = {
+    'SIZE': int(os.getenv('TOKEN_AUTH_CACHE_SIZE', 10000)),
+    'LOCAL_TTL': int(os.getenv('TOKEN_AUTH_LOCAL_TTL', 10)),
+    'SHARED_ALIAS': 'default' if REDIS_URL else None,
+    'SHARED_TTL': int(os.getenv('TOKEN_AUTH_SHARED_TTL', 5 * 60)),
+}
+
+# Доля запросов, для которых пишутся метрики SQL (api.middleware).
+# STRICT замеряет всё и падает при превышении бюджета запросов — для тестов.
+REQUEST_METRICS = {
+    'SAMPLE_RATE': float(os.getenv('REQUEST_METRICS_SAMPLE_RATE', 0.01)),
+    'SERVER_TIMING': os.getenv('REQUEST_METRICS_SERVER_TIMING', 'True') == 'True',
+    'STRICT': os.getenv('REQUEST_METRICS_STRICT', 'False') == 'True',
+    'QUERY_BUDGET': int(os.getenv('REQUEST_METRICS_QUERY_BUDGET', 20)),
+    'BUDGETS': {},
+    'DUPLICATE_THRESHOLD': 3,
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'api.metrics': {'handlers': ['console'], 'level': 'INFO'},
+    },
+}
+
+# Под ASGI отдавать GET-запросы рецептов, тегов и ингредиентов
+# асинхронными view (api/async_views.py).
+ASYNC_READ_PATH = os.getenv('ASYNC_READ_PATH', 'False') == 'True'
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -118,12 +239,26 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'backend_media')
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+RECIPE_IMAGE_MAX_SIZE = int(os.getenv('RECIPE_IMAGE_MAX_SIZE', 5 * 1024 * 1024))
+
+# Предел ширины × высоты: небольшой сжатый файл может раскрыться
+# в гигабайты пикселей при построении вариантов.
+RECIPE_IMAGE_MAX_PIXELS = int(os.getenv('RECIPE_IMAGE_MAX_PIXELS', 25_000_000))
+
+# Изображение приходит в JSON строкой base64, она на треть длиннее файла.
+DATA_UPLOAD_MAX_MEMORY_SIZE = RECIPE_IMAGE_MAX_SIZE * 4 // 3 + 1024 * 1024
+
+RECIPE_IMAGE_VARIANTS = {
+    'thumbnail': (160, 160),
+    'card': (480, 480),
+}
+
 
 MEDIA_ROOT = BASE_DIR.joinpath('media')
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ),
 
     'DEFAULT_PERMISSION_CLASSES': (
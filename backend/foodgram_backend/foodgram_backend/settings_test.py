@@ -0,0 +1,38 @@
+"""Настройки для запуска тестов.
+
+python3 manage.py test --settings=foodgram_backend.settings_test
+"""
+import tempfile
+
+from .settings import *  # noqa
+
+SECRET_KEY = 'test-secret-key'
+
+DEBUG = False
+
+# replica_0 — вторая база SQLite в роли реплики. В тестах она зеркало
+# default (TEST MIRROR): то же содержимое, но своё соединение, так что
+# по запросам на каждом алиасе видно, куда их отправил ReplicaRouter.
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    },
+    'replica_0': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+TOKEN_AUTH_CACHE = {**TOKEN_AUTH_CACHE, 'SHARED_ALIAS': None}  # noqa
+
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+MEDIA_ROOT = tempfile.mkdtemp(prefix='foodgram-test-media-')
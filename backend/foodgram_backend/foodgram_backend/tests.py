@@ -0,0 +1,88 @@
+from unittest import skipUnless
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from .routers import use_replica
+from api.authentication import local_cache
+from recipes.models import Ingredient, Recipe
+from users.models import User
+
+
+@skipUnless('replica_0' in settings.DATABASES, 'нужна база replica_0')
+class ReplicaRouterTest(TransactionTestCase):
+    """Куда ReplicaRouter отправляет запросы.
+
+    TransactionTestCase: внутри транзакции TestCase все чтения и так
+    идут в default.
+    """
+    databases = {'default', 'replica_0'}
+
+    def setUp(self):
+        cache.clear()
+        local_cache.items.clear()
+        self.user = User.objects.create_user(
+            email='user@example.com', username='user', first_name='user',
+            last_name='user', password='Pass-12345',
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.recipe = Recipe.objects.create(
+            author=self.user, name='Soup', text='Описание', cooking_time=5,
+        )
+        self.ingredient = Ingredient.objects.create(
+            name='Соль', measurement_unit='г'
+        )
+
+    def request(self, method, url):
+        default = CaptureQueriesContext(connections['default'])
+        replica = CaptureQueriesContext(connections['replica_0'])
+        with default, replica:
+            response = getattr(self.client, method)(url)
+        return response, default, replica
+
+    def assert_tables(self, queries, tables, present=True):
+        sql = ' '.join(query['sql'] for query in queries)
+        for table in tables:
+            check = self.assertIn if present else self.assertNotIn
+            check(f'"{table}"', sql)
+
+    def test_safe_reads_use_replica(self):
+        for url, table in (
+            ('/api/recipes/', 'recipes_recipe'),
+            (f'/api/recipes/{self.recipe.id}/', 'recipes_recipe'),
+            (f'/api/ingredients/{self.ingredient.id}/', 'recipes_ingredient'),
+        ):
+            with self.subTest(url):
+                local_cache.items.clear()
+                response, default, replica = self.request('get', url)
+                self.assertEqual(response.status_code, 200)
+                self.assert_tables(replica, [table])
+                self.assert_tables(default, [table], present=False)
+                # Токен ищется в default до переключения на реплику.
+                self.assert_tables(default, ['authtoken_token'])
+                self.assert_tables(replica, ['authtoken_token'], present=False)
+
+    def test_writes_use_default(self):
+        response, default, replica = self.request(
+            'post', f'/api/recipes/{self.recipe.id}/favorite/'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assert_tables(default, ['recipes_userrecipe'])
+        self.assertEqual(len(replica), 0)
+
+    def test_reads_in_atomic_block_use_default(self):
+        with use_replica():
+            with CaptureQueriesContext(connections['replica_0']) as replica:
+                Recipe.objects.count()
+            default = CaptureQueriesContext(connections['default'])
+            with transaction.atomic(), default:
+                Recipe.objects.count()
+        self.assert_tables(replica, ['recipes_recipe'])
+        self.assert_tables(default, ['recipes_recipe'])
@@ -0,0 +1,11 @@
+from django.contrib import admin
+
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'name', 'status', 'attempts', 'user', 'created_at']
+    list_filter = ['status', 'name']
+    search_fields = ['name', 'user__username']
+    readonly_fields = ['result', 'error', 'locked_at', 'finished_at']
@@ -0,0 +1,31 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from jobs.queue import prune, schedule
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет завершённые фоновые задачи старше JOBS_RETENTION_DAYS '
+        'дней и файлы их результатов. С --schedule также ставит '
+        'периодическую очистку в очередь задач.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--schedule', action='store_true',
+            help='Поставить задачу jobs.prune, если её нет.',
+        )
+
+    def handle(self, *args, **options):
+        jobs = prune(timezone.now(), options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Удалено задач: {jobs}'))
+        if options['schedule'] and schedule(
+            'jobs.prune',
+            timedelta(seconds=settings.JOBS['PRUNE_INTERVAL']),
+        ):
+            self.stdout.write('Периодическая очистка поставлена в очередь')
@@ -0,0 +1,42 @@
+import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from jobs.queue import work
+
+
+class Command(BaseCommand):
+    help = 'Запускает воркеры очереди фоновых задач.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=2,
+            help='Сколько задач выполнять параллельно.',
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=1.0,
+            help='Пауза между опросами пустой очереди, секунды.',
+        )
+        parser.add_argument(
+            '--burst', action='store_true',
+            help='Выполнить накопившиеся задачи и выйти.',
+        )
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        if not options['burst']:
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                signal.signal(signum, lambda *args: stop.set())
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            futures = [
+                pool.submit(
+                    work, stop, options['burst'], options['poll_interval']
+                )
+                for _ in range(options['workers'])
+            ]
+        processed = sum(future.result() for future in futures)
+        self.stdout.write(self.style.SUCCESS(
+            f'Выполнено задач: {processed}'
+        ))
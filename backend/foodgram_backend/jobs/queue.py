@@ -0,0 +1,171 @@
+"""Очередь фоновых задач в базе данных.
+
+Задача — функция, зарегистрированная декоратором @task под именем и
+принимающая аргументы из Job.payload. enqueue() создаёт запись после
+фиксации транзакции, воркеры (manage.py run_workers) забирают готовые
+к запуску задачи условным UPDATE, поэтому одна задача не выполнится
+дважды даже без SELECT ... FOR UPDATE (SQLite). Упавшая задача
+перезапускается с экспоненциальной задержкой, пока не исчерпает
+max_attempts. Завершённые задачи удаляет периодическая задача jobs.prune.
+"""
+import logging
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+registry = {}
+
+RETRY_DELAY = timedelta(seconds=10)
+STALE_AFTER = timedelta(minutes=15)
+STALE_ERROR = 'Воркер не завершил задачу: попытки исчерпаны.'
+
+
+def task(name):
+    def decorator(func):
+        registry[name] = func
+        return func
+    return decorator
+
+
+def enqueue(name, payload=None, user=None, max_attempts=3, run_at=None):
+    if name not in registry:
+        raise KeyError(f'Неизвестная задача: {name}')
+    return Job.objects.create(
+        name=name, payload=payload or {}, user=user,
+        max_attempts=max_attempts, run_at=run_at or timezone.now(),
+    )
+
+
+def schedule(name, delay, payload=None):
+    """Ставит задачу через delay, если такая ещё не ждёт в очереди.
+
+    Периодическая задача вызывает schedule() для себя в блоке finally,
+    так что в очереди всегда не больше одного её запуска и ошибка не
+    обрывает цепочку. Поэтому такие задачи не повторяются после ошибки
+    (max_attempts=1): их и так перезапустит следующий запуск.
+    """
+    if Job.objects.filter(name=name, status=Job.QUEUED).exists():
+        return None
+    return enqueue(
+        name, payload, max_attempts=1, run_at=timezone.now() + delay
+    )
+
+
+def enqueue_on_commit(name, payload=None, **kwargs):
+    transaction.on_commit(lambda: enqueue(name, payload, **kwargs))
+
+
+def requeue_stale(now):
+    """Возвращает в очередь задачи, брошенные упавшими воркерами.
+
+    Брошенный запуск засчитывается как попытка: задача, которая роняет
+    воркер, не перезапускается бесконечно, а после max_attempts
+    помечается упавшей.
+    """
+    stale = Job.objects.filter(
+        status=Job.RUNNING, locked_at__lt=now - STALE_AFTER
+    )
+    failed = stale.filter(attempts__gte=F('max_attempts') - 1).update(
+        status=Job.FAILED, attempts=F('attempts') + 1, locked_at=None,
+        finished_at=now, error=STALE_ERROR,
+    )
+    return failed + stale.update(
+        status=Job.QUEUED, attempts=F('attempts') + 1, locked_at=None,
+    )
+
+
+def prune(now, batch_size=1000):
+    """Удаляет завершённые задачи старше JOBS['RETENTION_DAYS'].
+
+    Вместе с задачей удаляется файл её результата (result['file']).
+    """
+    finished = Job.objects.filter(
+        status__in=(Job.DONE, Job.FAILED),
+        finished_at__lt=now - timedelta(
+            days=settings.JOBS['RETENTION_DAYS']
+        ),
+    ).order_by('pk').values_list('pk', 'result')
+    pruned = 0
+    while True:
+        batch = list(finished[:batch_size])
+        if not batch:
+            return pruned
+        for _, result in batch:
+            if (result or {}).get('file'):
+                default_storage.delete(result['file'])
+        Job.objects.filter(pk__in=[pk for pk, _ in batch]).delete()
+        pruned += len(batch)
+
+
+def claim():
+    """Забирает одну готовую задачу или возвращает None."""
+    now = timezone.now()
+    while True:
+        job = Job.objects.filter(
+            status=Job.QUEUED, run_at__lte=now
+        ).order_by('run_at', 'id').first()
+        if job is None:
+            return None
+        claimed = Job.objects.filter(pk=job.pk, status=Job.QUEUED).update(
+            status=Job.RUNNING, locked_at=now,
+        )
+        if claimed:
+            job.status, job.locked_at = Job.RUNNING, now
+            return job
+
+
+def run(job):
+    job.attempts += 1
+    try:
+        result = registry[job.name](**job.payload)
+    except Exception:
+        job.error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            job.status = Job.QUEUED
+            job.run_at = timezone.now() + RETRY_DELAY * 2 ** (job.attempts - 1)
+        else:
+            job.status = Job.FAILED
+            job.finished_at = timezone.now()
+        logger.exception('Задача %s завершилась с ошибкой', job)
+    else:
+        job.status = Job.DONE
+        job.result = result
+        job.error = ''
+        job.finished_at = timezone.now()
+    job.locked_at = None
+    job.save()
+    return job
+
+
+def work(stop=None, burst=False, poll_interval=1.0):
+    """Цикл воркера: выполняет задачи, пока не выставлен stop.
+
+    В режиме burst выходит, как только очередь опустела, — так очередь
+    можно прогнать в том же процессе, например в тестах.
+    """
+    stop = stop or threading.Event()
+    processed = 0
+    try:
+        while not stop.is_set():
+            requeue_stale(timezone.now())
+            job = claim()
+            if job is None:
+                if burst:
+                    break
+                stop.wait(poll_interval)
+                continue
+            run(job)
+            processed += 1
+    finally:
+        connections.close_all()
+    return processed
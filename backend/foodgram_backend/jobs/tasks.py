@@ -0,0 +1,16 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .queue import prune, schedule, task
+
+
+@task('jobs.prune')
+def prune_jobs():
+    try:
+        return {'jobs': prune(timezone.now())}
+    finally:
+        schedule('jobs.prune', timedelta(
+            seconds=settings.JOBS['PRUNE_INTERVAL']
+        ))
@@ -0,0 +1,163 @@
+from datetime import timedelta
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from .models import Job
+from .queue import (RETRY_DELAY, STALE_AFTER, enqueue, prune, requeue_stale,
+                    task, work)
+from users.models import User
+
+
+@task('tests.echo')
+def echo(**payload):
+    return payload
+
+
+@task('tests.fail')
+def fail():
+    raise RuntimeError('Ошибка задачи')
+
+
+@task('tests.export')
+def export(text):
+    name = default_storage.save('exports/test.txt', ContentFile(text))
+    return {'file': name, 'filename': 'list.txt'}
+
+
+class QueueTest(TestCase):
+
+    def test_success(self):
+        job = enqueue('tests.echo', {'value': 1})
+        self.assertEqual(work(burst=True), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE)
+        self.assertEqual(job.attempts, 1)
+        self.assertEqual(job.result, {'value': 1})
+        self.assertIsNotNone(job.finished_at)
+
+    def test_delayed_job_waits(self):
+        job = enqueue(
+            'tests.echo', run_at=timezone.now() + timedelta(minutes=1)
+        )
+        self.assertEqual(work(burst=True), 0)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+
+    def test_retry_with_backoff(self):
+        job = enqueue('tests.fail', max_attempts=3)
+        for attempt in (1, 2):
+            started = timezone.now()
+            # Отложенный повтор в том же проходе не запускается.
+            with self.assertLogs('jobs.queue', 'ERROR'):
+                self.assertEqual(work(burst=True), 1)
+            job.refresh_from_db()
+            self.assertEqual(job.status, Job.QUEUED)
+            self.assertEqual(job.attempts, attempt)
+            self.assertIn('RuntimeError', job.error)
+            self.assertGreaterEqual(
+                job.run_at, started + RETRY_DELAY * 2 ** (attempt - 1)
+            )
+            Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        with self.assertLogs('jobs.queue', 'ERROR'):
+            self.assertEqual(work(burst=True), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.attempts, 3)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_requeue_stale(self):
+        now = timezone.now()
+        stale = enqueue('tests.echo')
+        running = enqueue('tests.echo')
+        Job.objects.filter(pk=stale.pk).update(
+            status=Job.RUNNING, locked_at=now - STALE_AFTER * 2
+        )
+        Job.objects.filter(pk=running.pk).update(
+            status=Job.RUNNING, locked_at=now
+        )
+        self.assertEqual(work(burst=True), 1)
+        stale.refresh_from_db()
+        running.refresh_from_db()
+        self.assertEqual(stale.status, Job.DONE)
+        self.assertEqual(stale.attempts, 2)
+        self.assertEqual(running.status, Job.RUNNING)
+
+    def test_stale_job_fails_after_max_attempts(self):
+        now = timezone.now()
+        job = enqueue('tests.echo', max_attempts=2)
+        for status in (Job.QUEUED, Job.FAILED):
+            Job.objects.filter(pk=job.pk).update(
+                status=Job.RUNNING, locked_at=now - STALE_AFTER * 2
+            )
+            self.assertEqual(requeue_stale(now), 1)
+            job.refresh_from_db()
+            self.assertEqual(job.status, status)
+        self.assertEqual(job.attempts, 2)
+        self.assertIsNotNone(job.finished_at)
+
+    @override_settings(JOBS={'RETENTION_DAYS': 7, 'PRUNE_INTERVAL': 60})
+    def test_prune(self):
+        now = timezone.now()
+        old, recent = (
+            enqueue('tests.export', {'text': 'Соль'}) for _ in range(2)
+        )
+        queued = enqueue('tests.echo')
+        work(burst=True)
+        old.refresh_from_db()
+        Job.objects.filter(pk__in=[old.pk, queued.pk]).update(
+            finished_at=now - timedelta(days=8)
+        )
+        Job.objects.filter(pk=queued.pk).update(status=Job.QUEUED)
+        self.assertTrue(default_storage.exists(old.result['file']))
+        self.assertEqual(prune(now), 1)
+        self.assertFalse(default_storage.exists(old.result['file']))
+        self.assertCountEqual(
+            Job.objects.values_list('pk', flat=True), [recent.pk, queued.pk]
+        )
+
+
+class JobDownloadTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner, cls.other = (
+            User.objects.create_user(
+                email=f'{name}@example.com', username=name,
+                first_name=name, last_name=name, password='Pass-12345',
+            )
+            for name in ('owner', 'other')
+        )
+
+    def client_for(self, user):
+        client = APIClient()
+        token, _ = Token.objects.get_or_create(user=user)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        return client
+
+    def test_download(self):
+        job = enqueue('tests.export', {'text': 'Соль — 5'}, user=self.owner)
+        url = f'/api/jobs/{job.id}/download/'
+        client = self.client_for(self.owner)
+        self.assertEqual(client.get(url).status_code, 404)
+        work(burst=True)
+        response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('list.txt', response['Content-Disposition'])
+        self.assertEqual(
+            b''.join(response.streaming_content).decode(), 'Соль — 5'
+        )
+        self.assertEqual(
+            self.client_for(self.other).get(url).status_code, 404
+        )
+
+    def test_status(self):
+        job = enqueue('tests.echo', {'value': 1}, user=self.owner)
+        work(burst=True)
+        response = self.client_for(self.owner).get(f'/api/jobs/{job.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], Job.DONE)
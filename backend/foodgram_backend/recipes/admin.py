@@ -1,16 +1,29 @@
 from django.contrib import admin
 
-from .models import Ingredient, Recipe, Tag
+from .models import Ingredient, Recipe, RecipeTag, Tag
+
+
+class RecipeTagInline(admin.TabularInline):
+    # tags идёт через RecipeTag и не попадает в форму рецепта сам.
+    model = RecipeTag
+    extra = 1
 
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ['name', 'author', 'pub_date']
-    search_fields = ['name', 'author']
+    list_display = [
+        'name', 'author', 'pub_date', 'number_of_additions', 'carts_count',
+    ]
+    readonly_fields = ['number_of_additions', 'carts_count']
+    search_fields = ['name', 'author__username']
     list_filter = ['author', 'name', 'tags']
+    inlines = [RecipeTagInline]
 
+    @admin.display(
+        description='Добавлений в избранное', ordering='favorites_count'
+    )
     def number_of_additions(self, obj: Recipe):
-        return obj.shopping_users.all().count()
+        return obj.favorites_count
 
 
 @admin.register(Ingredient)
@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class RecipesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recipes'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+
+        from . import signals  # noqa: F401
+        from .legacy import merge_after_migrate
+        from .search import install_search
+        post_migrate.connect(install_search, sender=self)
+        post_migrate.connect(merge_after_migrate, sender=self)
@@ -0,0 +1,84 @@
+import threading
+import time
+from bisect import bisect_left
+
+from asgiref.sync import sync_to_async
+
+from .models import Ingredient
+
+
+class IngredientIndex:
+    """Индекс ингредиентов в памяти процесса для автодополнения.
+
+    Держит отсортированный список названий в нижнем регистре: совпадения
+    по началу строки ищутся бинарным поиском, по вхождению — проходом по
+    списку (около двух тысяч строк). Запросов к базе при поиске нет.
+    Индекс строится при первом обращении, сбрасывается сигналами
+    сохранения и удаления Ingredient, а раз в ttl секунд перестраивается,
+    чтобы подхватить изменения из других процессов.
+    """
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._keys = None
+        self._ingredients = None
+        self._built_at = 0
+
+    def invalidate(self):
+        with self._lock:
+            self._keys = None
+            self._ingredients = None
+
+    def build(self):
+        ingredients = sorted(
+            Ingredient.objects.only('id', 'name', 'measurement_unit'),
+            key=lambda ingredient: (ingredient.name.lower(), ingredient.id),
+        )
+        keys = [ingredient.name.lower() for ingredient in ingredients]
+        with self._lock:
+            self._keys, self._ingredients = keys, ingredients
+            self._built_at = time.monotonic()
+        return keys, ingredients
+
+    def is_stale(self):
+        return (
+            self._keys is None
+            or time.monotonic() - self._built_at > self.ttl
+        )
+
+    def get(self):
+        keys, ingredients = self._keys, self._ingredients
+        if keys is None or time.monotonic() - self._built_at > self.ttl:
+            keys, ingredients = self.build()
+        return keys, ingredients
+
+    def search(self, query, limit=None):
+        """Сначала названия, начинающиеся с query, затем содержащие его."""
+        keys, ingredients = self.get()
+        query = query.lower()
+        if not query:
+            return ingredients[:limit]
+        result = []
+        position = bisect_left(keys, query)
+        while (
+            position < len(keys) and keys[position].startswith(query)
+            and (limit is None or len(result) < limit)
+        ):
+            result.append(ingredients[position])
+            position += 1
+        for key, ingredient in zip(keys, ingredients):
+            if limit is not None and len(result) >= limit:
+                break
+            if query in key and not key.startswith(query):
+                result.append(ingredient)
+        return result
+
+    async def asearch(self, query, limit=None):
+        """search() для асинхронного кода: строит индекс в потоке."""
+        if self.is_stale():
+            await sync_to_async(self.build)()
+        return self.search(query, limit)
+
+
+ingredient_index = IngredientIndex()
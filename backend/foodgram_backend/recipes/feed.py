@@ -0,0 +1,89 @@
+"""Лента рецептов авторов, на которых подписан пользователь.
+
+Ленты строятся при записи: новый рецепт раскладывается по
+TimelineEntry всех подписчиков автора (fan_out, фоновой задачей), а
+подписка добавляет в ленту последние BACKFILL рецептов автора. Авторов
+с FANOUT_LIMIT подписчиков и больше при записи не раскладываем — их
+рецепты подмешиваются в ленту при чтении (feed_queryset).
+"""
+from django.conf import settings
+from django.db.models import Exists, F, OuterRef, Q
+
+from .models import Recipe, TimelineEntry
+from users.models import Follow
+
+
+def is_large(followers_count):
+    return followers_count >= settings.FEED['FANOUT_LIMIT']
+
+
+def fan_out(recipe_id, batch_size=1000):
+    """Добавляет рецепт в ленты подписчиков автора; возвращает их число."""
+    recipe = Recipe.objects.filter(pk=recipe_id).values(
+        'author_id', 'pub_date', 'author__followers_count'
+    ).first()
+    if (
+        recipe is None or recipe['author_id'] is None
+        or is_large(recipe['author__followers_count'])
+    ):
+        return 0
+    entries = [
+        TimelineEntry(
+            user_id=follower_id, recipe_id=recipe_id,
+            author_id=recipe['author_id'], pub_date=recipe['pub_date'],
+        )
+        for follower_id in Follow.objects.filter(
+            author_id=recipe['author_id']
+        ).values_list('follower_id', flat=True).iterator()
+    ]
+    TimelineEntry.objects.bulk_create(
+        entries, batch_size=batch_size, ignore_conflicts=True
+    )
+    return len(entries)
+
+
+def backfill(follower_id, author_id):
+    """Последние рецепты автора в ленту нового подписчика."""
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(
+                user_id=follower_id, recipe_id=recipe_id,
+                author_id=author_id, pub_date=pub_date,
+            )
+            for recipe_id, pub_date in Recipe.objects.filter(
+                author_id=author_id
+            ).order_by('-pub_date', 'id').values_list(
+                'id', 'pub_date'
+            )[:settings.FEED['BACKFILL']]
+        ),
+        ignore_conflicts=True,
+    )
+
+
+def forget_author(follower_id, author_id):
+    TimelineEntry.objects.filter(
+        user_id=follower_id, author_id=author_id
+    ).delete()
+
+
+def feed_queryset(queryset, user):
+    """Рецепты ленты user с полем feed_date для пагинации.
+
+    Если пользователь не подписан на крупных авторов, выборка — один
+    проход по индексу ленты. Иначе к ней добавляются рецепты крупных
+    авторов, и порядок берётся из индекса рецептов по дате.
+    """
+    large_authors = Follow.objects.filter(
+        follower=user,
+        author__followers_count__gte=settings.FEED['FANOUT_LIMIT'],
+    ).values('author_id')
+    if not large_authors.exists():
+        return queryset.filter(timeline_entries__user=user).annotate(
+            feed_date=F('timeline_entries__pub_date')
+        )
+    return queryset.filter(
+        Q(Exists(TimelineEntry.objects.filter(
+            user=user, recipe=OuterRef('pk')
+        )))
+        | Q(author_id__in=large_authors)
+    ).annotate(feed_date=F('pub_date'))
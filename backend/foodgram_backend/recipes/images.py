@@ -0,0 +1,135 @@
+"""Хранение и обработка изображений рецептов.
+
+Файлы кладутся по SHA-256 содержимого, поэтому одинаковые картинки
+хранятся один раз. Уменьшенные варианты (в исходном формате и WebP)
+строятся фоновой задачей recipes.process_image после фиксации
+транзакции, не задерживая ответ; пути к ним записываются
+в Recipe.image_variants.
+"""
+import hashlib
+import os
+import re
+import tempfile
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.dispatch import Signal
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+from PIL import Image, ImageOps
+
+HASH_RE = re.compile(r'^[0-9a-f]{64}$')
+VARIANTS_DIR = 'recipes/variants'
+
+# Варианты записываются через update(), который не вызывает post_save.
+variants_ready = Signal()
+
+
+def file_digest(file, chunk_size=64 * 1024):
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in iter(lambda: file.read(chunk_size), b''):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def recipe_image_path(instance, filename):
+    """recipes/ab/abcdef….png — путь по хэшу содержимого."""
+    stem, extension = os.path.splitext(os.path.basename(filename))
+    if not HASH_RE.match(stem):
+        stem = file_digest(instance.image.file)
+    return f'recipes/{stem[:2]}/{stem}{extension.lower()}'
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, где имя файла определяется его содержимым.
+
+    Если файл уже есть, он не перезаписывается и не получает суффикс.
+    Новый файл пишется во временный и атомарно переименовывается, так
+    что параллельная загрузка той же картинки безопасна.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def _save(self, name, content):
+        if self.exists(name):
+            return name
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                for chunk in content.chunks():
+                    file.write(chunk)
+            if self.file_permissions_mode is not None:
+                os.chmod(tmp_path, self.file_permissions_mode)
+            os.replace(tmp_path, full_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        return name
+
+
+recipe_image_storage = ContentAddressedStorage()
+
+
+def variant_keys():
+    return [
+        key
+        for variant in settings.RECIPE_IMAGE_VARIANTS
+        for key in (variant, f'{variant}_webp')
+    ]
+
+
+def encode(image, image_format):
+    buffer = BytesIO()
+    if image_format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    image.save(buffer, image_format, optimize=True, quality=85)
+    return buffer.getvalue()
+
+
+def make_variants(source_name, storage=recipe_image_storage):
+    """Строит варианты source_name, пропуская уже существующие."""
+    stem = os.path.splitext(os.path.basename(source_name))[0]
+    with storage.open(source_name) as file, Image.open(file) as source:
+        image_format = 'JPEG' if source.format == 'JPEG' else 'PNG'
+        extension = 'jpg' if image_format == 'JPEG' else 'png'
+        source = ImageOps.exif_transpose(source)
+        variants = {}
+        for variant, size in settings.RECIPE_IMAGE_VARIANTS.items():
+            image = source.copy()
+            image.thumbnail(size)
+            for key, fmt, ext in (
+                (variant, image_format, extension),
+                (f'{variant}_webp', 'WEBP', 'webp'),
+            ):
+                name = f'{VARIANTS_DIR}/{stem[:2]}/{stem}/{variant}.{ext}'
+                if not storage.exists(name):
+                    storage.save(name, ContentFile(encode(image, fmt)))
+                variants[key] = name
+    return variants
+
+
+def process_recipe_image(source_name):
+    from .models import Recipe
+
+    variants = make_variants(source_name)
+    Recipe.objects.filter(image=source_name).update(
+        image_variants=dict(variants, source=source_name),
+        updated_at=timezone.now(),
+    )
+    variants_ready.send(sender=Recipe, source_name=source_name)
+
+
+def schedule_variants(source_name):
+    from jobs.queue import enqueue_on_commit
+
+    enqueue_on_commit('recipes.process_image', {'source_name': source_name})
@@ -0,0 +1,97 @@
+"""Перенос избранного и корзин из прежних хранилищ в UserRecipe.
+
+До UserRecipe списки лежали в Favorites, Carts и связях User.favorite и
+User.shopping_cart. Строки переносятся пачками: пачка копируется в
+UserRecipe и удаляется из источника в одной короткой транзакции, так
+что повторный запуск продолжает с места остановки и не возвращает
+рецепты, которые пользователи с тех пор убрали. Перенос выполняется
+после каждого migrate (обработчик post_migrate), пока источники не
+опустеют, и командой merge_user_lists.
+"""
+import time
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import F
+
+from .models import Carts, Favorites, UserRecipe
+from users.models import User
+
+
+def get_sources():
+    """(название, выборка с датой добавления added, вид списка).
+
+    У связей ManyToMany даты добавления нет — берётся дата публикации
+    рецепта, чтобы перенесённые строки не попали в окно trending.
+    """
+    return (
+        ('Favorites', Favorites.objects.annotate(added=F('created_at')),
+         UserRecipe.FAVORITE),
+        ('Carts', Carts.objects.annotate(added=F('created_at')),
+         UserRecipe.CART),
+        ('User.favorite', User.favorite.through.objects.annotate(
+            added=F('recipe__pub_date')
+        ), UserRecipe.FAVORITE),
+        ('User.shopping_cart', User.shopping_cart.through.objects.annotate(
+            added=F('recipe__pub_date')
+        ), UserRecipe.CART),
+    )
+
+
+def move(queryset, kind, batch_size=1000, pause=0):
+    """Переносит строки queryset в UserRecipe; возвращает их число."""
+    rows = queryset.order_by('pk').values_list(
+        'pk', 'user_id', 'recipe_id', 'added'
+    )
+    moved = 0
+    while True:
+        with transaction.atomic():
+            batch = list(rows[:batch_size])
+            if not batch:
+                return moved
+            UserRecipe.objects.bulk_create(
+                [
+                    UserRecipe(
+                        user_id=user_id, recipe_id=recipe_id, kind=kind,
+                        created_at=added,
+                    )
+                    for _, user_id, recipe_id, added in batch
+                ],
+                ignore_conflicts=True,
+            )
+            queryset.model.objects.filter(
+                pk__in=[pk for pk, *_ in batch]
+            ).delete()
+        moved += len(batch)
+        if pause:
+            time.sleep(pause)
+
+
+def merge_legacy_lists(batch_size=1000, pause=0, rebuild=True, stdout=None):
+    """Переносит все прежние списки; возвращает {источник: строк}.
+
+    bulk_create не вызывает сигналы, поэтому после переноса списки
+    покупок и счётчики пересчитываются по UserRecipe (если rebuild и
+    было что переносить).
+    """
+    tables = connections[DEFAULT_DB_ALIAS].introspection.table_names()
+    moved = {
+        name: move(queryset, kind, batch_size, pause)
+        for name, queryset, kind in get_sources()
+        if queryset.model._meta.db_table in tables
+    }
+    if rebuild and any(moved.values()):
+        call_command('rebuild_shopping_lists', stdout=stdout)
+        call_command('reconcile_counters', stdout=stdout)
+    return moved
+
+
+def merge_after_migrate(using=DEFAULT_DB_ALIAS, verbosity=1, stdout=None,
+                        **kwargs):
+    """Обработчик post_migrate: новый код сразу видит прежние списки."""
+    if using != DEFAULT_DB_ALIAS:
+        return
+    tables = connections[using].introspection.table_names()
+    if UserRecipe._meta.db_table in tables:
+        merge_legacy_lists(stdout=stdout if verbosity else StringIO())
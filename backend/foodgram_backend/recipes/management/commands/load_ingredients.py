@@ -0,0 +1,99 @@
+import csv
+import json
+import time
+from itertools import islice
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.models import Ingredient
+from recipes.signals import ingredients_loaded
+
+
+def read_csv(file, skip_header=False):
+    reader = csv.reader(file)
+    if skip_header:
+        next(reader, None)
+    for row in reader:
+        if row:
+            yield row[0].strip(), row[1].strip()
+
+
+def read_json(file, buffer_size=64 * 1024):
+    """Построчно отдаёт объекты из JSON-массива, не читая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer = file.read(buffer_size).lstrip()
+    if not buffer.startswith('['):
+        raise CommandError('Ожидается JSON-массив объектов')
+    buffer = buffer[1:]
+    while True:
+        buffer = buffer.lstrip().lstrip(',').lstrip()
+        if buffer.startswith(']'):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            chunk = file.read(buffer_size)
+            if not chunk:
+                raise CommandError('JSON-файл обрывается посередине')
+            buffer += chunk
+            continue
+        yield item['name'].strip(), item['measurement_unit'].strip()
+        buffer = buffer[end:]
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает ингредиенты из CSV (name,measurement_unit) или JSON. '
+        'Уже существующие пары пропускаются, повторный запуск безопасен.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', type=Path)
+        parser.add_argument(
+            '--format', choices=('csv', 'json'),
+            help='Формат файла, по умолчанию — по расширению.',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='Сколько строк вставлять одним INSERT.',
+        )
+        parser.add_argument(
+            '--skip-header', action='store_true',
+            help='Пропустить первую строку CSV.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or path.suffix.lstrip('.').lower()
+        if file_format not in ('csv', 'json'):
+            raise CommandError(f'Неизвестный формат файла: {path}')
+        started = time.perf_counter()
+        read = 0
+        with open(path, encoding='utf-8') as file, transaction.atomic():
+            before = Ingredient.objects.count()
+            rows = (
+                read_csv(file, options['skip_header'])
+                if file_format == 'csv' else read_json(file)
+            )
+            while True:
+                chunk = list(islice(rows, options['chunk_size']))
+                if not chunk:
+                    break
+                read += len(chunk)
+                Ingredient.objects.bulk_create(
+                    [
+                        Ingredient(name=name, measurement_unit=unit)
+                        for name, unit in chunk
+                    ],
+                    ignore_conflicts=True,
+                )
+            created = Ingredient.objects.count() - before
+        ingredients_loaded.send(sender=Ingredient, created=created)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Прочитано {read}, добавлено {created}, '
+            f'пропущено {read - created} за {elapsed:.2f} с '
+            f'({read / elapsed if elapsed else read:.0f} строк/с)'
+        ))
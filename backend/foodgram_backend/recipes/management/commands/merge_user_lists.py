@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from recipes.legacy import merge_legacy_lists
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит избранное и списки покупок из Favorites, Carts и '
+        'связей User.favorite/User.shopping_cart в UserRecipe. '
+        'Перенесённые строки удаляются из источника в той же '
+        'транзакции, повторный запуск безопасен. migrate выполняет '
+        'перенос сам; команда нужна, чтобы провести его с паузами.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--pause', type=float, default=0,
+            help='Пауза между пачками, секунды: меньше нагрузка на базу.',
+        )
+        parser.add_argument(
+            '--skip-rebuild', action='store_true',
+            help='Не пересобирать списки покупок и счётчики после переноса.',
+        )
+
+    def handle(self, *args, **options):
+        moved = merge_legacy_lists(
+            options['batch_size'], options['pause'],
+            rebuild=not options['skip_rebuild'], stdout=self.stdout,
+        )
+        for name, count in moved.items():
+            self.stdout.write(f'{name}: перенесено строк {count}')
+        self.stdout.write(self.style.SUCCESS('Перенос завершён'))
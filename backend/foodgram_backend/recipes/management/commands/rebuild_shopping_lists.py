@@ -0,0 +1,79 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Sum
+
+from recipes.models import IngredientAmount, ShoppingListItem, UserRecipe
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересобирает материализованные списки покупок из корзин '
+        'или (с --verify) только сверяет их.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify', action='store_true',
+            help='Только сравнить с корзинами, ничего не меняя.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Размер пачки для bulk_create.',
+        )
+
+    def expected(self):
+        return {
+            (row['recipe__in_lists__user'], row['ingredient']): row['total']
+            for row in IngredientAmount.objects.filter(
+                recipe__in_lists__kind=UserRecipe.CART,
+            ).values(
+                'recipe__in_lists__user', 'ingredient'
+            ).annotate(total=Sum('amount')).order_by().iterator()
+            if row['total']
+        }
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            expected = self.expected()
+            actual = {
+                (user_id, ingredient_id): amount
+                for user_id, ingredient_id, amount
+                in ShoppingListItem.objects.values_list(
+                    'user_id', 'ingredient_id', 'amount'
+                ).iterator()
+            }
+            diff = {
+                key for key in expected.keys() | actual.keys()
+                if expected.get(key) != actual.get(key)
+            }
+            for user_id, ingredient_id in sorted(diff):
+                self.stderr.write(
+                    f'user={user_id} ingredient={ingredient_id}: '
+                    f'ожидалось {expected.get((user_id, ingredient_id))}, '
+                    f'в таблице {actual.get((user_id, ingredient_id))}'
+                )
+            if diff:
+                raise CommandError(f'Расхождений: {len(diff)}')
+            self.stdout.write(self.style.SUCCESS(
+                f'Списки покупок совпадают ({len(expected)} строк)'
+            ))
+            return
+        with transaction.atomic():
+            # Корзины читаются под блокировкой списков покупок: изменение
+            # корзины между чтением и перезаписью иначе потерялось бы.
+            ShoppingListItem.objects.lock()
+            ShoppingListItem.objects.all().delete()
+            expected = self.expected()
+            ShoppingListItem.objects.bulk_create(
+                (
+                    ShoppingListItem(
+                        user_id=user_id, ingredient_id=ingredient_id,
+                        amount=amount,
+                    )
+                    for (user_id, ingredient_id), amount in expected.items()
+                ),
+                batch_size=options['batch_size'],
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Списки покупок пересобраны ({len(expected)} строк)'
+        ))
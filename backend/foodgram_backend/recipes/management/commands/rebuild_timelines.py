@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.feed import backfill
+from recipes.models import TimelineEntry
+from users.models import Follow
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересобирает ленты подписок: для каждой подписки на автора '
+        'без массовой аудитории — его последние рецепты.'
+    )
+
+    def handle(self, *args, **options):
+        follows = Follow.objects.filter(
+            author__followers_count__lt=settings.FEED['FANOUT_LIMIT']
+        ).values_list('follower_id', 'author_id')
+        with transaction.atomic():
+            TimelineEntry.objects.all().delete()
+            for follower_id, author_id in follows.iterator():
+                backfill(follower_id, author_id)
+        self.stdout.write(self.style.SUCCESS(
+            f'Записей в лентах: {TimelineEntry.objects.count()}'
+        ))
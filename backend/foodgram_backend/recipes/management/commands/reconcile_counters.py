@@ -0,0 +1,84 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Recipe, UserRecipe
+from recipes.signals import update_counters
+from users.models import Follow, User
+
+# Модель со счётчиками: {поле: (выборка связей, внешний ключ)}.
+COUNTERS = (
+    (Recipe, {
+        'favorites_count': (UserRecipe.objects.favorites(), 'recipe'),
+        'carts_count': (UserRecipe.objects.carts(), 'recipe'),
+    }),
+    (User, {
+        'recipes_count': (Recipe.objects.all(), 'author'),
+        'followers_count': (Follow.objects.all(), 'author'),
+    }),
+)
+
+
+def count_of(queryset, key):
+    return Coalesce(Subquery(
+        queryset.filter(**{key: OuterRef('pk')}).order_by().values(
+            key
+        ).annotate(total=Count('*')).values('total')
+    ), 0)
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает счётчики favorites_count, carts_count, '
+        'recipes_count и followers_count и исправляет расхождения.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify', action='store_true',
+            help='Только показать расхождения, ничего не меняя.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько строк проверять за один запрос.',
+        )
+
+    def drifted(self, model, counters, batch_size):
+        """Пачки id строк, у которых счётчик не совпадает с фактом."""
+        queryset = model.objects.only('pk', *counters).annotate(**{
+            f'actual_{field}': count_of(*source)
+            for field, source in counters.items()
+        }).order_by('pk')
+        last_pk = 0
+        while True:
+            batch = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                return
+            last_pk = batch[-1].pk
+            yield [
+                obj.pk for obj in batch
+                if any(
+                    getattr(obj, field) != getattr(obj, f'actual_{field}')
+                    for field in counters
+                )
+            ]
+
+    def handle(self, *args, **options):
+        for model, counters in COUNTERS:
+            fixed = 0
+            for pks in self.drifted(model, counters, options['batch_size']):
+                fixed += len(pks)
+                if pks and not options['verify']:
+                    # Пересчёт в самом UPDATE не теряет приращения,
+                    # сделанные сигналами между проверкой и записью.
+                    update_counters(model.objects.filter(pk__in=pks), **{
+                        field: count_of(*source)
+                        for field, source in counters.items()
+                    })
+            name = model._meta.verbose_name_plural
+            if options['verify']:
+                self.stdout.write(f'{name}: расхождений {fixed}')
+            else:
+                self.stdout.write(self.style.SUCCESS(
+                    f'{name}: исправлено {fixed}'
+                ))
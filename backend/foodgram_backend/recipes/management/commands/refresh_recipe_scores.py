@@ -0,0 +1,32 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from jobs.queue import schedule
+from recipes.trending import refresh_scores
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает рейтинг рецептов для /api/recipes/trending/. '
+        'С --schedule также ставит периодический пересчёт в очередь задач.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--schedule', action='store_true',
+            help='Поставить задачу recipes.refresh_scores, если её нет.',
+        )
+
+    def handle(self, *args, **options):
+        recipes = refresh_scores(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Рецептов в рейтинге: {recipes}'
+        ))
+        if options['schedule'] and schedule(
+            'recipes.refresh_scores',
+            timedelta(seconds=settings.RECIPE_SCORES['REFRESH_INTERVAL']),
+        ):
+            self.stdout.write('Периодический пересчёт поставлен в очередь')
@@ -0,0 +1,278 @@
+import hashlib
+import json
+import random
+from io import BytesIO
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.validators import MaxValueValidator
+from django.db import transaction
+from PIL import Image
+from rest_framework.authtoken.models import Token
+
+from jobs.queue import enqueue_on_commit
+from recipes.images import recipe_image_storage
+from recipes.models import (Ingredient, IngredientAmount, Recipe, RecipeTag,
+                            Tag, UserRecipe)
+from recipes.signals import dataset_seeded
+from users.models import Follow, User
+
+PREFIX = 'bench_'
+FIXTURES = Path(settings.BASE_DIR) / 'fixtures.json'
+WORDS = (
+    'суп', 'салат', 'пирог', 'каша', 'рагу', 'запеканка', 'омлет',
+    'домашний', 'быстрый', 'летний', 'острый', 'сырный', 'овощной',
+)
+
+
+def pairs(rng, left_ids, right_ids, per_left, exclude_self=False):
+    """Уникальные пары (left, right), по per_left на каждый left."""
+    for left in left_ids:
+        candidates = rng.sample(
+            right_ids, min(per_left + exclude_self, len(right_ids))
+        )
+        candidates = [right for right in candidates
+                      if not (exclude_self and right == left)]
+        for right in candidates[:per_left]:
+            yield left, right
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт синтетический набор данных для нагрузочных тестов: '
+        'пользователей с токенами, рецепты, подписки, избранное и корзины. '
+        'Теги и ингредиенты берутся из fixtures.json, если их нет в базе.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--recipes', type=int, default=1000)
+        parser.add_argument(
+            '--follows', type=int, default=10,
+            help='Подписок на пользователя.',
+        )
+        parser.add_argument(
+            '--favorites', type=int, default=20,
+            help='Рецептов в избранном у пользователя.',
+        )
+        parser.add_argument(
+            '--carts', type=int, default=5,
+            help='Рецептов в корзине у пользователя.',
+        )
+        parser.add_argument(
+            '--ingredients', type=int, default=8,
+            help='Максимум ингредиентов в рецепте.',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--password', default='bench-password-1')
+        parser.add_argument(
+            '--output', type=Path,
+            help='Куда записать токены и id рецептов для benchmarks.replay.',
+        )
+        parser.add_argument(
+            '--clear', action='store_true',
+            help='Удалить ранее созданный набор перед генерацией.',
+        )
+
+    def load_dictionaries(self):
+        if Tag.objects.exists() and Ingredient.objects.exists():
+            return
+        with open(FIXTURES, encoding='utf-8') as file:
+            fixtures = json.load(file)
+        models = {'recipes.tag': Tag, 'recipes.ingredient': Ingredient}
+        for label, model in models.items():
+            model.objects.bulk_create(
+                (
+                    model(**item['fields'])
+                    for item in fixtures if item['model'] == label
+                ),
+                ignore_conflicts=True,
+            )
+
+    def make_image(self):
+        buffer = BytesIO()
+        Image.new('RGB', (480, 320), (230, 160, 90)).save(buffer, 'PNG')
+        data = buffer.getvalue()
+        digest = hashlib.sha256(data).hexdigest()
+        return recipe_image_storage.save(
+            f'recipes/{digest[:2]}/{digest}.png', ContentFile(data)
+        )
+
+    def clear(self):
+        Recipe.objects.filter(author__username__startswith=PREFIX).delete()
+        User.objects.filter(username__startswith=PREFIX).delete()
+
+    def create_users(self, count, password, batch_size):
+        start = User.objects.filter(username__startswith=PREFIX).count()
+        password = make_password(password)
+        User.objects.bulk_create(
+            (
+                User(
+                    username=f'{PREFIX}{number}',
+                    email=f'{PREFIX}{number}@example.com',
+                    first_name='Тест', last_name=f'Пользователь {number}',
+                    password=password,
+                )
+                for number in range(start, start + count)
+            ),
+            batch_size=batch_size,
+        )
+        users = list(User.objects.filter(
+            username__startswith=PREFIX
+        ).order_by('id')[start:])
+        Token.objects.bulk_create(
+            (Token(key=Token.generate_key(), user=user) for user in users),
+            batch_size=batch_size,
+        )
+        return users
+
+    def create_recipes(self, rng, users, count, options):
+        image = self.make_image()
+        first_id = Recipe.objects.order_by('-id').values_list(
+            'id', flat=True
+        ).first() or 0
+        Recipe.objects.bulk_create(
+            (
+                Recipe(
+                    author=rng.choice(users),
+                    name=' '.join(rng.sample(WORDS, 2)).capitalize(),
+                    text=' '.join(rng.choices(WORDS, k=30)),
+                    cooking_time=rng.randint(5, 180),
+                    image=image,
+                )
+                for _ in range(count)
+            ),
+            batch_size=options['batch_size'],
+        )
+        recipe_ids = list(Recipe.objects.filter(
+            id__gt=first_id
+        ).values_list('id', flat=True))
+        tag_ids = list(Tag.objects.values_list('id', flat=True))
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        RecipeTag.objects.bulk_create(
+            (
+                RecipeTag(recipe_id=recipe_id, tag_id=tag_id)
+                for recipe_id in recipe_ids
+                for tag_id in rng.sample(
+                    tag_ids, rng.randint(1, min(3, len(tag_ids)))
+                )
+            ),
+            batch_size=options['batch_size'],
+        )
+        # Количества в пределах валидаторов модели, как у данных из API.
+        max_amount = min(
+            validator.limit_value
+            for validator in IngredientAmount._meta.get_field(
+                'amount'
+            ).validators
+            if isinstance(validator, MaxValueValidator)
+        )
+        IngredientAmount.objects.bulk_create(
+            (
+                IngredientAmount(
+                    recipe_id=recipe_id, ingredient_id=ingredient_id,
+                    amount=rng.randint(1, max_amount),
+                )
+                for recipe_id in recipe_ids
+                for ingredient_id in rng.sample(
+                    ingredient_ids,
+                    rng.randint(1, min(options['ingredients'],
+                                       len(ingredient_ids))),
+                )
+            ),
+            batch_size=options['batch_size'],
+        )
+        # bulk_create не вызывает post_save, варианты картинки — задачей.
+        enqueue_on_commit('recipes.process_image', {'source_name': image})
+        return recipe_ids
+
+    def create_relations(self, rng, user_ids, recipe_ids, options):
+        batch_size = options['batch_size']
+        Follow.objects.bulk_create(
+            (
+                Follow(follower_id=follower, author_id=author)
+                for follower, author in pairs(
+                    rng, user_ids, user_ids, options['follows'],
+                    exclude_self=True,
+                )
+            ),
+            batch_size=batch_size, ignore_conflicts=True,
+        )
+        for kind, per_user in (
+            (UserRecipe.FAVORITE, options['favorites']),
+            (UserRecipe.CART, options['carts']),
+        ):
+            UserRecipe.objects.bulk_create(
+                (
+                    UserRecipe(user_id=user_id, recipe_id=recipe_id, kind=kind)
+                    for user_id, recipe_id in pairs(
+                        rng, user_ids, recipe_ids, per_user
+                    )
+                ),
+                batch_size=batch_size, ignore_conflicts=True,
+            )
+
+    def write_dataset(self, path, users, recipe_ids, options):
+        """Сохраняет то, что нужно benchmarks.replay для запросов."""
+        tokens = dict(Token.objects.filter(
+            user__in=users
+        ).values_list('user_id', 'key'))
+        authored = {}
+        for author_id, recipe_id in Recipe.objects.filter(
+            id__in=recipe_ids
+        ).values_list('author_id', 'id'):
+            authored.setdefault(author_id, []).append(recipe_id)
+        dataset = {
+            'users': [
+                {
+                    'id': user.id,
+                    'email': user.email,
+                    'token': tokens[user.id],
+                    'recipes': authored.get(user.id, [])[:5],
+                }
+                for user in users
+            ],
+            'recipes': recipe_ids,
+            'tags': list(Tag.objects.values_list('id', flat=True)),
+            'ingredients': list(
+                Ingredient.objects.values_list('id', flat=True)[:100]
+            ),
+            'password': options['password'],
+        }
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(dataset, file, ensure_ascii=False)
+
+    def handle(self, *args, **options):
+        if options['users'] < 1:
+            raise CommandError('Нужен хотя бы один пользователь')
+        rng = random.Random(options['seed'])
+        with transaction.atomic():
+            if options['clear']:
+                self.clear()
+            self.load_dictionaries()
+            users = self.create_users(
+                options['users'], options['password'], options['batch_size']
+            )
+            recipe_ids = (
+                self.create_recipes(rng, users, options['recipes'], options)
+                if options['recipes'] else []
+            )
+            user_ids = [user.id for user in users]
+            self.create_relations(rng, user_ids, recipe_ids, options)
+            # Всё вставлено без сигналов — пересобираем списки покупок,
+            # счётчики и ленты подписок.
+            call_command('rebuild_shopping_lists', stdout=self.stdout)
+            call_command('reconcile_counters', stdout=self.stdout)
+            call_command('rebuild_timelines', stdout=self.stdout)
+            dataset_seeded.send(sender=self.__class__)
+        if options['output']:
+            self.write_dataset(options['output'], users, recipe_ids, options)
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано: пользователей {len(users)}, '
+            f'рецептов {len(recipe_ids)}'
+        ))
@@ -3,11 +3,78 @@ from django.core.exceptions import ValidationError
 from django.core.validators import (MaxValueValidator, MinValueValidator,
                                     RegexValidator,
                                     validate_image_file_extension)
-from django.db import models
+from django.db import connections, models, router, transaction
+from django.db.models.functions import Greatest, RowNumber
+from django.utils import timezone
 
+from .images import recipe_image_path, recipe_image_storage
 from users.models import User
 
 
+class RecipeQuerySet(models.QuerySet):
+
+    def with_related(self, user):
+        """Всё, что нужно RecipeReadSerializer, за постоянное число запросов.
+
+        Автор (вместе с флагом подписки), теги и ингредиенты подгружаются
+        отдельными запросами на всю выборку, а не на каждый рецепт.
+        """
+        return self.prefetch_related(
+            models.Prefetch(
+                'author', queryset=User.objects.with_is_subscribed(user)
+            ),
+            'tags',
+            models.Prefetch(
+                'amount',
+                queryset=IngredientAmount.objects.select_related('ingredient')
+            ),
+        ).with_user_flags(user)
+
+    def with_user_flags(self, user):
+        """Флаги избранного и корзины одним запросом на всю выборку."""
+        if user.is_anonymous:
+            return self.annotate(
+                is_favorited=models.Value(False),
+                is_in_shopping_cart=models.Value(False),
+            )
+        entries = UserRecipe.objects.filter(
+            user=user, recipe=models.OuterRef('pk'),
+        )
+        return self.annotate(
+            is_favorited=models.Exists(entries.favorites()),
+            is_in_shopping_cart=models.Exists(entries.carts()),
+        )
+
+    def previews_by_author(self, author_ids, limit=None):
+        """Первые limit рецептов каждого автора одним запросом.
+
+        Нумерация ROW_NUMBER() OVER (PARTITION BY author) считается в
+        подзапросе, а отбор по номеру — во внешнем запросе: Django 4.1
+        не умеет фильтровать по оконным функциям.
+        """
+        queryset = self.filter(author_id__in=author_ids).only(
+            'id', 'author_id', 'name', 'image', 'image_variants',
+            'cooking_time',
+        )
+        if limit is None:
+            recipes = queryset
+        else:
+            sql, params = queryset.annotate(row_number=models.Window(
+                expression=RowNumber(),
+                partition_by=models.F('author_id'),
+                order_by=(models.F('pub_date').desc(), models.F('id').asc()),
+            )).order_by().query.sql_with_params()
+            recipes = self.raw(
+                f'SELECT * FROM ({sql}) ranked WHERE row_number <= %s '
+                'ORDER BY author_id, row_number',
+                (*params, limit),
+            )
+        previews = {author_id: [] for author_id in author_ids}
+        for recipe in recipes:
+            previews[recipe.author_id].append(recipe)
+        return previews
+
+
 class Recipe(models.Model):
     author = models.ForeignKey(
         User,
@@ -26,10 +93,17 @@ class Recipe(models.Model):
     )
 
     image = models.ImageField(
-        upload_to='recipes/',
+        upload_to=recipe_image_path,
+        storage=recipe_image_storage,
         verbose_name='Изображение рецепта',
         validators=[validate_image_file_extension, ],
     )
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Уменьшенные копии изображения',
+    )
     text = models.TextField(verbose_name='Описание рецепта', )
     ingredients = models.ManyToManyField(
         'Ingredient',
@@ -38,6 +112,7 @@ class Recipe(models.Model):
     )
     tags = models.ManyToManyField(
         'Tag',
+        through='RecipeTag',
         related_name='recipes',
         verbose_name='Теги',
     )
@@ -52,9 +127,34 @@ class Recipe(models.Model):
         auto_now_add=True,
         verbose_name='Дата публикации',
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения',
+    )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В избранном',
+    )
+    carts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В списках покупок',
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
-        ordering = ['-pub_date']
+        ordering = ['-pub_date', 'id']
+        indexes = [
+            models.Index(
+                fields=['-pub_date', 'id'], name='recipe_pub_date_id_idx'
+            ),
+            models.Index(
+                fields=['-favorites_count', '-pub_date', 'id'],
+                name='recipe_popular_idx',
+            ),
+        ]
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепт'
 
@@ -87,6 +187,37 @@ class Tag(models.Model):
         return self.name
 
 
+class RecipeTag(models.Model):
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='recipe_tags',
+    )
+    tag = models.ForeignKey(
+        Tag,
+        on_delete=models.CASCADE,
+        related_name='recipe_tags',
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'tag', ],
+                name='Unique recipe tag.'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['tag', 'recipe'], name='recipetag_tag_recipe_idx'
+            ),
+        ]
+        verbose_name = 'Тег рецепта'
+        verbose_name_plural = 'Теги рецептов'
+
+    def __str__(self) -> str:
+        return f'{self.recipe} -> {self.tag}'
+
+
 class Ingredient(models.Model):
     name = models.CharField(
         max_length=128,
@@ -98,6 +229,12 @@ class Ingredient(models.Model):
     )
 
     class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit', ],
+                name='Unique ingredient.'
+            )
+        ]
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиент'
 
@@ -137,6 +274,79 @@ class IngredientAmount(models.Model):
         return f'{self.recipe.name}, {self.ingredient.name}: {self.amount}'
 
 
+class UserRecipeQuerySet(models.QuerySet):
+
+    def favorites(self):
+        return self.filter(kind=UserRecipe.FAVORITE)
+
+    def carts(self):
+        return self.filter(kind=UserRecipe.CART)
+
+
+class UserRecipe(models.Model):
+    """Рецепт в избранном или в списке покупок пользователя.
+
+    Единственное хранилище обоих списков: вид списка задаёт kind.
+    Уникальный индекс (user, kind, recipe) обслуживает флаги и фильтры
+    is_favorited/is_in_shopping_cart, (recipe, kind) — счётчики рецепта,
+    (kind, created_at, recipe) — окно рейтинга trending.
+    """
+    FAVORITE = 'favorite'
+    CART = 'cart'
+    KINDS = (
+        (FAVORITE, 'Избранное'),
+        (CART, 'Список покупок'),
+    )
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='recipe_lists',
+        verbose_name='Пользователь',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='in_lists',
+        verbose_name='Рецепт',
+    )
+    kind = models.CharField(
+        max_length=16, choices=KINDS, verbose_name='Список'
+    )
+    created_at = models.DateTimeField(
+        default=timezone.now, verbose_name='Добавлен'
+    )
+
+    objects = UserRecipeQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'kind', 'recipe', ],
+                name='Unique user recipe list entry.'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['recipe', 'kind'], name='userrecipe_recipe_kind_idx'
+            ),
+            models.Index(
+                fields=['kind', 'created_at', 'recipe'],
+                name='userrecipe_kind_created_idx',
+            ),
+        ]
+        verbose_name = 'Рецепт в списке пользователя'
+        verbose_name_plural = 'Избранное и списки покупок'
+
+    def __str__(self) -> str:
+        return f'{self.user} -> {self.recipe} ({self.kind})'
+
+
+# Favorites и Carts — прежнее хранилище списков. Приложение их не читает
+# и не пишет: после migrate строки переносятся в UserRecipe и удаляются
+# отсюда (recipes.legacy), индексы таблицам больше не нужны. Модели
+# удаляются следующим релизом: сейчас migrate сбросил бы таблицы раньше,
+# чем строки будут перенесены.
 class Favorites(models.Model):
 
     recipe = models.ForeignKey(
@@ -151,19 +361,14 @@ class Favorites(models.Model):
         to=User,
         on_delete=models.CASCADE,
     )
+    created_at = models.DateTimeField(
+        verbose_name="Добавлен",
+        default=timezone.now,
+    )
 
     class Meta:
         verbose_name = "Избранный рецепт"
         verbose_name_plural = "Избранные рецепты"
-        constraints = (
-            models.UniqueConstraint(
-                fields=(
-                    "recipe",
-                    "user",
-                ),
-                name="\n%(app_label)s_%(class)s recipe is favorite alredy\n",
-            ),
-        )
 
     def __str__(self) -> str:
         return f"{self.user} -> {self.recipe}"
@@ -183,42 +388,240 @@ class Carts(models.Model):
         to=User,
         on_delete=models.CASCADE,
     )
+    created_at = models.DateTimeField(
+        verbose_name="Добавлен",
+        default=timezone.now,
+    )
 
     class Meta:
         verbose_name = "Рецепт в списке покупок"
         verbose_name_plural = "Рецепты в списке покупок"
-        constraints = (
-            models.UniqueConstraint(
-                fields=(
-                    "recipe",
-                    "user",
-                ),
-                name="\n%(app_label)s_%(class)s recipe is cart alredy\n",
-            ),
-        )
 
     def __str__(self) -> str:
         return f"{self.user} -> {self.recipe}"
 
 
-class FavoriteShoppingCart(models.Model):
+class RecipeScore(models.Model):
+    """Рейтинг рецепта в /api/recipes/trending/.
+
+    Недавние добавления в избранное и корзину, затухающие с возрастом
+    рецепта (см. recipes.trending). Таблица пересчитывается целиком
+    командой refresh_recipe_scores или фоновой задачей; в ней только
+    рецепты с активностью за последнее окно.
+    """
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='score',
+        verbose_name='Рецепт',
+    )
+    score = models.FloatField(verbose_name='Рейтинг')
+    favorites = models.PositiveIntegerField(
+        verbose_name='Добавлений в избранное за окно'
+    )
+    carts = models.PositiveIntegerField(
+        verbose_name='Добавлений в корзину за окно'
+    )
+    computed_at = models.DateTimeField(verbose_name='Пересчитан')
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['-score', 'recipe'], name='recipescore_score_idx'
+            ),
+        ]
+        verbose_name = 'Рейтинг рецепта'
+        verbose_name_plural = 'Рейтинги рецептов'
+
+    def __str__(self) -> str:
+        return f'{self.recipe_id}: {self.score:.4f}'
+
+
+class TimelineEntry(models.Model):
+    """Рецепт в ленте подписок пользователя (/api/recipes/feed/).
+
+    Строки создаются при публикации рецепта для всех подписчиков автора
+    и при подписке — для последних рецептов автора (см. recipes.feed).
+    pub_date повторяет дату рецепта, чтобы страница ленты читалась
+    одним проходом по индексу (user, -pub_date, recipe).
+    """
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
-        verbose_name='Пользователь',
-
+        related_name='timeline',
+        verbose_name='Владелец ленты',
     )
     recipe = models.ForeignKey(
         Recipe,
         on_delete=models.CASCADE,
+        related_name='timeline_entries',
         verbose_name='Рецепт',
     )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор рецепта',
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
 
     class Meta:
-        abstract = True
         constraints = [
             models.UniqueConstraint(
-                fields=('user', 'recipe'),
-                name='%(app_label)s_%(class)s_unique'
+                fields=['user', 'recipe', ],
+                name='Unique timeline recipe.'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', 'recipe'],
+                name='timeline_user_pub_date_idx',
+            ),
+        ]
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Ленты подписок'
+
+    def __str__(self) -> str:
+        return f'{self.user_id} <- {self.recipe_id}'
+
+
+class ShoppingListQuerySet(models.QuerySet):
+
+    def add_amounts(self, rows, batch_size=500):
+        """Прибавляет количества rows ([(user_id, ingredient_id, amount)]).
+
+        INSERT ... ON CONFLICT DO UPDATE складывает количество в самой
+        базе: у bulk_create(update_conflicts=True) значение только
+        заменяется, и при параллельной вставке одной строки одно из
+        слагаемых терялось бы.
+        """
+        connection = connections[router.db_for_write(self.model)]
+        quote = connection.ops.quote_name
+        table = quote(self.model._meta.db_table)
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'INSERT INTO {table} '
+                    f'({quote("user_id")}, {quote("ingredient_id")}, '
+                    f'{quote("amount")}) '
+                    f'VALUES {", ".join(["(%s, %s, %s)"] * len(batch))} '
+                    f'ON CONFLICT ({quote("user_id")}, '
+                    f'{quote("ingredient_id")}) DO UPDATE SET '
+                    f'{quote("amount")} = {table}.{quote("amount")} '
+                    f'+ EXCLUDED.{quote("amount")}',
+                    [value for row in batch for value in row],
+                )
+
+    def lock(self):
+        """Блокирует запись в таблицу до конца текущей транзакции.
+
+        Изменения корзин пишут в список покупок в своей транзакции, так
+        что блокировка дожидается начатых изменений и задерживает новые.
+        В SQLite запись и так идёт по очереди: блокировку берёт первая
+        запись транзакции.
+        """
+        connection = connections[router.db_for_write(self.model)]
+        if connection.vendor == 'postgresql':
+            table = connection.ops.quote_name(self.model._meta.db_table)
+            with connection.cursor() as cursor:
+                cursor.execute(f'LOCK TABLE {table} IN EXCLUSIVE MODE')
+
+    def apply_deltas(self, user_ids, deltas):
+        """Прибавляет deltas ({ingredient_id: amount}) к спискам user_ids.
+
+        Положительные изменения записываются через add_amounts, строки
+        создаются при необходимости; отрицательные — UPDATE с F() на
+        каждый ингредиент, не ниже нуля. Обнулившиеся строки удаляются.
+        """
+        user_ids = list(user_ids)
+        deltas = {key: value for key, value in deltas.items() if value}
+        if not user_ids or not deltas:
+            return
+        with transaction.atomic():
+            for ingredient_id, delta in deltas.items():
+                if delta < 0:
+                    # Greatest: при расхождении с корзинами (его
+                    # исправляет rebuild_shopping_lists) количество не
+                    # уходит ниже нуля и не нарушает CHECK поля.
+                    self.filter(
+                        user_id__in=user_ids, ingredient_id=ingredient_id
+                    ).update(amount=Greatest(models.F('amount') + delta, 0))
+            self.add_amounts([
+                (user_id, ingredient_id, delta)
+                for ingredient_id, delta in deltas.items() if delta > 0
+                for user_id in user_ids
+            ])
+            self.filter(
+                user_id__in=user_ids, amount__lte=0
+            ).delete()
+
+    def add_recipes(self, user_id, recipe_ids, sign=1):
+        self.apply_deltas([user_id], {
+            ingredient_id: sign * (total or 0)
+            for ingredient_id, total in IngredientAmount.objects.filter(
+                recipe_id__in=recipe_ids
+            ).values('ingredient_id').annotate(
+                total=models.Sum('amount')
+            ).values_list('ingredient_id', 'total').order_by()
+        })
+
+    def add_recipe(self, user_id, recipe_id, sign=1):
+        self.add_recipes(user_id, [recipe_id], sign)
+
+    def remove_recipe(self, user_id, recipe_id):
+        self.add_recipe(user_id, recipe_id, sign=-1)
+
+    def change_recipe(self, recipe_id, old_amounts, new_amounts):
+        """Переносит изменение состава рецепта во все списки с ним."""
+        deltas = {
+            ingredient_id: (
+                new_amounts.get(ingredient_id, 0)
+                - old_amounts.get(ingredient_id, 0)
+            )
+            for ingredient_id in old_amounts.keys() | new_amounts.keys()
+        }
+        self.apply_deltas(
+            UserRecipe.objects.carts().filter(
+                recipe_id=recipe_id
+            ).values_list('user_id', flat=True),
+            deltas,
+        )
+
+
+class ShoppingListItem(models.Model):
+    """Материализованный список покупок: сумма ингредиентов корзины.
+
+    Обновляется инкрементально при добавлении и удалении рецептов
+    из корзины и при изменении состава рецепта; пересобирается командой
+    rebuild_shopping_lists.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items',
+        verbose_name='Владелец списка',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items',
+        verbose_name='Ингредиент',
+    )
+    amount = models.PositiveIntegerField(verbose_name='Количество')
+
+    objects = ShoppingListQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient', ],
+                name='Unique shopping list ingredient.'
+            )
+        ]
+        verbose_name = 'Строка списка покупок'
+        verbose_name_plural = 'Списки покупок'
+
+    def __str__(self) -> str:
+        return f'{self.user}: {self.ingredient} {self.amount}'
@@ -0,0 +1,141 @@
+"""Полнотекстовый поиск рецептов.
+
+На PostgreSQL у recipes_recipe появляется хранимая генерируемая колонка
+search_vector (tsvector по названию и описанию), которую база сама
+пересчитывает при каждом сохранении, GIN-индекс по ней и триграммный
+GIN-индекс по названию (pg_trgm). На SQLite вместо этого создаётся
+внешняя FTS5-таблица, синхронизируемая триггерами. Объекты создаются
+после migrate и не описываются в моделях, потому что не переносимы
+между базами.
+"""
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Q
+from django.db.models.expressions import RawSQL
+
+from .models import Recipe
+
+TABLE = Recipe._meta.db_table
+FTS_TABLE = f'{TABLE}_fts'
+SEARCH_CONFIG = 'russian'
+
+POSTGRES_SQL = (
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    f'''ALTER TABLE {TABLE} ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(name, '')), 'A')
+            || setweight(
+                to_tsvector('{SEARCH_CONFIG}', coalesce(text, '')), 'B'
+            )
+        ) STORED''',
+    f'''CREATE INDEX IF NOT EXISTS recipe_search_vector_idx
+        ON {TABLE} USING gin (search_vector)''',
+    f'''CREATE INDEX IF NOT EXISTS recipe_name_trgm_idx
+        ON {TABLE} USING gin (name gin_trgm_ops)''',
+)
+
+SQLITE_SQL = (
+    f'''CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, text, content='{TABLE}', content_rowid='id',
+        tokenize='unicode61'
+    )''',
+    f'''CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {TABLE}
+    BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, text)
+        VALUES (new.id, new.name, new.text);
+    END''',
+    f'''CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {TABLE}
+    BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, text)
+        VALUES ('delete', old.id, old.name, old.text);
+    END''',
+    f'''CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE ON {TABLE}
+    BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, text)
+        VALUES ('delete', old.id, old.name, old.text);
+        INSERT INTO {FTS_TABLE}(rowid, name, text)
+        VALUES (new.id, new.name, new.text);
+    END''',
+    # Миграции SQLite пересоздают таблицы и теряют триггеры, поэтому
+    # после каждого migrate индекс пересобирается целиком.
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+)
+
+_installed = {}
+
+
+def install_search(using='default', **kwargs):
+    """Обработчик post_migrate: создаёт поисковые объекты в базе."""
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        statements = POSTGRES_SQL
+    elif connection.vendor == 'sqlite':
+        statements = SQLITE_SQL
+    else:
+        return
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+    _installed.pop(using, None)
+
+
+def is_installed(using):
+    if using not in _installed:
+        connection = connections[using]
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                columns = connection.introspection.get_table_description(
+                    cursor, TABLE
+                )
+                _installed[using] = any(
+                    column.name == 'search_vector' for column in columns
+                )
+            else:
+                _installed[using] = (
+                    FTS_TABLE in connection.introspection.table_names(cursor)
+                )
+    return _installed[using]
+
+
+def fts5_query(query):
+    """Экранирует ввод пользователя для MATCH: слова ищутся по префиксу."""
+    return ' '.join(
+        '"{}"*'.format(word) for word in re.findall(r'\w+', query)
+    )
+
+
+def search_recipes(queryset, query):
+    """Фильтрует queryset по query и сортирует по релевантности."""
+    query = query.strip()
+    if not query:
+        return queryset
+    using = queryset.db
+    vendor = connections[using].vendor
+    if vendor == 'postgresql' and is_installed(using):
+        queryset = queryset.alias(search_match=RawSQL(
+            f"{TABLE}.search_vector @@ websearch_to_tsquery("
+            f"'{SEARCH_CONFIG}', %s) OR {TABLE}.name %% %s",
+            (query, query), output_field=BooleanField(),
+        )).filter(search_match=True).annotate(search_rank=RawSQL(
+            f"ts_rank({TABLE}.search_vector, websearch_to_tsquery("
+            f"'{SEARCH_CONFIG}', %s)) + similarity({TABLE}.name, %s)",
+            (query, query), output_field=FloatField(),
+        ))
+    elif vendor == 'sqlite' and is_installed(using):
+        match = fts5_query(query)
+        if not match:
+            return queryset
+        queryset = queryset.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+            (match,),
+        )).annotate(search_rank=RawSQL(
+            f'SELECT -bm25({FTS_TABLE}, 10.0, 1.0) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = {TABLE}.id',
+            (match,), output_field=FloatField(),
+        ))
+    else:
+        return queryset.filter(
+            Q(name__icontains=query) | Q(text__icontains=query)
+        )
+    return queryset.order_by('-search_rank', '-pub_date', 'id')
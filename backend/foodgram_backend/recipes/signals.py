@@ -0,0 +1,154 @@
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+
+from .autocomplete import ingredient_index
+from .feed import backfill, forget_author, is_large
+from .images import schedule_variants
+from .models import Ingredient, Recipe, ShoppingListItem, UserRecipe
+from jobs.queue import enqueue_on_commit
+from users.models import Follow, User
+
+# Отправляется после массовой загрузки ингредиентов: bulk_create
+# не вызывает post_save.
+ingredients_loaded = Signal()
+
+# Отправляется после заполнения базы командой seed_dataset: все данные
+# вставлены через bulk_create, без сигналов моделей.
+dataset_seeded = Signal()
+
+# Отправляется после массового добавления рецептов в избранное или
+# корзину (sender — UserRecipe, аргументы kind, user_id и recipe_ids):
+# bulk_create не вызывает post_save.
+user_list_added = Signal()
+
+# Отправляется после изменения счётчиков через update_counters (sender —
+# модель со счётчиками): UPDATE не вызывает post_save.
+counters_changed = Signal()
+
+
+# Счётчики, которые ведутся на стороне модели-связки (для UserRecipe —
+# своего вида списка): модель и поле счётчика и внешний ключ на его
+# строку. Расхождения после bulk_create и ручных правок исправляет
+# команда reconcile_counters.
+COUNTERS = {
+    (UserRecipe, UserRecipe.FAVORITE): (
+        Recipe, 'favorites_count', 'recipe_id'
+    ),
+    (UserRecipe, UserRecipe.CART): (Recipe, 'carts_count', 'recipe_id'),
+    (Recipe, None): (User, 'recipes_count', 'author_id'),
+    (Follow, None): (User, 'followers_count', 'author_id'),
+}
+
+
+def get_counter(sender, instance):
+    return COUNTERS.get((sender, getattr(instance, 'kind', None)))
+
+
+def update_counters(queryset, **values):
+    """UPDATE счётчиков строк queryset.
+
+    Счётчики рецепта входят в его ответ API, поэтому вместе с ними
+    сдвигается updated_at: от него зависят ETag и Last-Modified.
+    """
+    if queryset.model is Recipe:
+        values['updated_at'] = timezone.now()
+    queryset.update(**values)
+    counters_changed.send(sender=queryset.model)
+
+
+def shift_counter(model, pk, field, delta):
+    # UPDATE ... SET field = field + delta: без гонок между запросами.
+    update_counters(
+        model.objects.filter(pk=pk), **{field: Greatest(F(field) + delta, 0)}
+    )
+
+
+def increment_counter(sender, instance, created, **kwargs):
+    counter = get_counter(sender, instance)
+    if created and counter is not None:
+        model, field, key = counter
+        shift_counter(model, getattr(instance, key), field, 1)
+
+
+@receiver(user_list_added)
+def increment_counters(sender, kind, recipe_ids, **kwargs):
+    model, field, key = COUNTERS[(sender, kind)]
+    update_counters(
+        model.objects.filter(pk__in=recipe_ids), **{field: F(field) + 1}
+    )
+
+
+def decrement_counter(sender, instance, **kwargs):
+    counter = get_counter(sender, instance)
+    if counter is not None:
+        model, field, key = counter
+        shift_counter(model, getattr(instance, key), field, -1)
+
+
+# Подключение к каждой модели отдельно: получатель без sender отключил
+# бы быстрое каскадное удаление у всех моделей.
+for model in {model for model, _ in COUNTERS}:
+    post_save.connect(increment_counter, sender=model)
+    post_delete.connect(decrement_counter, sender=model)
+
+
+@receiver(post_save, sender=UserRecipe)
+def add_to_shopping_list(sender, instance, created, **kwargs):
+    if created and instance.kind == UserRecipe.CART:
+        ShoppingListItem.objects.add_recipe(
+            instance.user_id, instance.recipe_id
+        )
+
+
+@receiver(user_list_added)
+def add_many_to_shopping_list(sender, kind, user_id, recipe_ids, **kwargs):
+    if kind == UserRecipe.CART:
+        ShoppingListItem.objects.add_recipes(user_id, recipe_ids)
+
+
+@receiver(pre_delete, sender=UserRecipe)
+def remove_from_shopping_list(sender, instance, **kwargs):
+    # pre_delete: при каскадном удалении рецепта его ингредиенты
+    # ещё не удалены и вычитаемые количества известны.
+    if instance.kind == UserRecipe.CART:
+        ShoppingListItem.objects.remove_recipe(
+            instance.user_id, instance.recipe_id
+        )
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(ingredients_loaded)
+def invalidate_ingredient_index(sender, **kwargs):
+    ingredient_index.invalidate()
+
+
+@receiver(post_save, sender=Recipe)
+def process_recipe_image(sender, instance, **kwargs):
+    if (
+        instance.image
+        and instance.image_variants.get('source') != instance.image.name
+    ):
+        schedule_variants(instance.image.name)
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_recipe(sender, instance, created, **kwargs):
+    if created:
+        enqueue_on_commit('recipes.fan_out', {'recipe_id': instance.id})
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, **kwargs):
+    if created and not is_large(User.objects.filter(
+        pk=instance.author_id
+    ).values_list('followers_count', flat=True).get()):
+        backfill(instance.follower_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def clear_timeline(sender, instance, **kwargs):
+    forget_author(instance.follower_id, instance.author_id)
@@ -0,0 +1,38 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management import call_command
+
+from .feed import fan_out
+from .images import process_recipe_image
+from .trending import refresh_scores
+from jobs.queue import schedule, task
+
+
+@task('recipes.process_image')
+def process_image(source_name):
+    process_recipe_image(source_name)
+    return {'source': source_name}
+
+
+@task('recipes.rebuild_shopping_lists')
+def rebuild_shopping_lists():
+    call_command('rebuild_shopping_lists', verbosity=0)
+    return {}
+
+
+@task('recipes.refresh_scores')
+def refresh_recipe_scores():
+    # Следующий запуск ставится и после ошибки: иначе цепочка
+    # пересчётов оборвалась бы до ручного refresh_recipe_scores.
+    try:
+        return {'recipes': refresh_scores()}
+    finally:
+        schedule('recipes.refresh_scores', timedelta(
+            seconds=settings.RECIPE_SCORES['REFRESH_INTERVAL']
+        ))
+
+
+@task('recipes.fan_out')
+def fan_out_recipe(recipe_id):
+    return {'followers': fan_out(recipe_id)}
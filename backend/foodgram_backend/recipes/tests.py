@@ -0,0 +1,200 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.sql import emit_post_migrate_signal
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.deletion import Collector
+from django.test import TestCase
+from django.utils import timezone
+
+from .models import (Carts, Favorites, Ingredient, IngredientAmount, Recipe,
+                     RecipeScore, ShoppingListItem, Tag, TimelineEntry,
+                     UserRecipe)
+from jobs.models import Job
+from jobs.queue import schedule, work
+from users.models import User
+
+
+class ShoppingListTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create_user(
+                email=f'u{n}@example.com', username=f'u{n}',
+                first_name='u', last_name='u', password='Pass-12345',
+            )
+            for n in range(2)
+        ]
+        cls.salt, cls.flour = (
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('Соль', 'Мука')
+        )
+
+    def amounts(self, user):
+        return dict(ShoppingListItem.objects.filter(user=user).values_list(
+            'ingredient_id', 'amount'
+        ))
+
+    def test_add_amounts_sums_existing_rows(self):
+        first, second = self.users
+        ShoppingListItem.objects.create(
+            user=first, ingredient=self.salt, amount=5
+        )
+        ShoppingListItem.objects.add_amounts([
+            (first.id, self.salt.id, 3),
+            (first.id, self.flour.id, 2),
+            (second.id, self.salt.id, 7),
+        ])
+        self.assertEqual(
+            self.amounts(first), {self.salt.id: 8, self.flour.id: 2}
+        )
+        self.assertEqual(self.amounts(second), {self.salt.id: 7})
+
+    def test_apply_deltas(self):
+        user_ids = [user.id for user in self.users]
+        ShoppingListItem.objects.apply_deltas(
+            user_ids, {self.salt.id: 4, self.flour.id: 1}
+        )
+        ShoppingListItem.objects.apply_deltas(
+            user_ids, {self.salt.id: 2, self.flour.id: -1}
+        )
+        for user in self.users:
+            self.assertEqual(self.amounts(user), {self.salt.id: 6})
+
+    def test_apply_deltas_floor(self):
+        user = self.users[0]
+        ShoppingListItem.objects.create(
+            user=user, ingredient=self.salt, amount=1
+        )
+        ShoppingListItem.objects.apply_deltas([user.id], {self.salt.id: -5})
+        self.assertEqual(self.amounts(user), {})
+
+
+class MergeLegacyListsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.author = (
+            User.objects.create_user(
+                email=f'{name}@example.com', username=name,
+                first_name=name, last_name=name, password='Pass-12345',
+            )
+            for name in ('user', 'author')
+        )
+        cls.salt = Ingredient.objects.create(name='Соль', measurement_unit='г')
+        cls.recipes = Recipe.objects.bulk_create(
+            Recipe(
+                author=cls.author, name=f'Recipe {n}', text='Описание',
+                cooking_time=5, image='recipes/test.png',
+            )
+            for n in range(3)
+        )
+        IngredientAmount.objects.bulk_create(
+            IngredientAmount(recipe=recipe, ingredient=cls.salt, amount=2)
+            for recipe in cls.recipes
+        )
+
+    def setUp(self):
+        first, second, third = self.recipes
+        Favorites.objects.create(user=self.user, recipe=first)
+        Carts.objects.create(user=self.user, recipe=second)
+        # Тот же рецепт в двух хранилищах переносится один раз.
+        self.user.favorite.add(first, third)
+        self.user.shopping_cart.add(third)
+
+    def merge(self, *args):
+        call_command('merge_user_lists', *args, stdout=StringIO())
+
+    def lists(self):
+        return set(UserRecipe.objects.values_list('recipe_id', 'kind'))
+
+    def test_moves_rows(self):
+        first, second, third = self.recipes
+        self.merge('--batch-size', '1')
+        self.assertEqual(self.lists(), {
+            (first.id, UserRecipe.FAVORITE), (third.id, UserRecipe.FAVORITE),
+            (second.id, UserRecipe.CART), (third.id, UserRecipe.CART),
+        })
+        self.assertFalse(Favorites.objects.exists())
+        self.assertFalse(Carts.objects.exists())
+        self.assertFalse(self.user.favorite.exists())
+        self.assertFalse(self.user.shopping_cart.exists())
+        self.assertEqual(
+            self.user.shopping_list_items.get(ingredient=self.salt).amount, 4
+        )
+        third.refresh_from_db()
+        self.assertEqual((third.favorites_count, third.carts_count), (1, 1))
+
+    def test_rerun_keeps_removed_entries_removed(self):
+        first = self.recipes[0]
+        self.merge()
+        UserRecipe.objects.favorites().get(recipe=first).delete()
+        self.merge()
+        self.assertNotIn((first.id, UserRecipe.FAVORITE), self.lists())
+
+    def test_runs_after_migrate(self):
+        emit_post_migrate_signal(verbosity=0, interactive=False, db='default')
+        self.assertEqual(len(self.lists()), 4)
+        self.assertFalse(Favorites.objects.exists())
+
+
+class RecipeAdminTest(TestCase):
+
+    def test_tags_inline(self):
+        admin = User.objects.create_superuser(
+            email='admin@example.com', username='admin', first_name='admin',
+            last_name='admin', password='Pass-12345',
+        )
+        self.client.force_login(admin)
+        response = self.client.get('/admin/recipes/recipe/add/')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'recipe_tags-TOTAL_FORMS')
+
+
+class FastDeleteTest(TestCase):
+
+    def test_models_without_receivers(self):
+        # Получатели сигналов без sender отключают быстрое удаление.
+        collector = Collector(using=DEFAULT_DB_ALIAS)
+        for model in (TimelineEntry, ShoppingListItem, RecipeScore, Job):
+            with self.subTest(model.__name__):
+                self.assertTrue(
+                    collector.can_fast_delete(model.objects.all())
+                )
+
+
+class SeedDatasetTest(TestCase):
+
+    def test_amounts_within_model_bounds(self):
+        Tag.objects.create(name='Тег', color='#ff0000', slug='tag')
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {n}', measurement_unit='г')
+            for n in range(5)
+        )
+        call_command(
+            'seed_dataset', users=3, recipes=50, ingredients=5,
+            stdout=StringIO(),
+        )
+        amounts = IngredientAmount.objects.values_list('amount', flat=True)
+        self.assertTrue(amounts)
+        self.assertLessEqual(max(amounts), 20)
+        self.assertGreaterEqual(min(amounts), 1)
+
+
+class RefreshScoresTaskTest(TestCase):
+
+    def test_reschedules_after_error(self):
+        job = schedule('recipes.refresh_scores', timedelta())
+        with mock.patch(
+            'recipes.tasks.refresh_scores', side_effect=RuntimeError
+        ), self.assertLogs('jobs.queue', 'ERROR'):
+            self.assertEqual(work(burst=True), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertTrue(Job.objects.filter(
+            name='recipes.refresh_scores', status=Job.QUEUED,
+            run_at__gt=timezone.now(),
+        ).exists())
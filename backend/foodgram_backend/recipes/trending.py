@@ -0,0 +1,75 @@
+"""Рейтинг рецептов для ленты trending.
+
+Очки рецепта — добавления в избранное и корзину за последние
+WINDOW_DAYS дней с весами FAVORITE_WEIGHT и CART_WEIGHT. Они делятся
+на (возраст в часах + 2) ** GRAVITY, поэтому свежий рецепт с той же
+активностью стоит выше старого. Считать это на каждый запрос дорого,
+поэтому результат хранится в RecipeScore и пересчитывается
+refresh_scores() по расписанию.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import Recipe, RecipeScore, UserRecipe
+
+
+def get_score(favorites, carts, pub_date, now):
+    config = settings.RECIPE_SCORES
+    age = max((now - pub_date).total_seconds(), 0) / 3600
+    points = (
+        config['FAVORITE_WEIGHT'] * favorites + config['CART_WEIGHT'] * carts
+    )
+    return points / (age + 2) ** config['GRAVITY']
+
+
+def recent_activity(since):
+    """{recipe_id: [избранное, корзины]} за время после since.
+
+    Один запрос на вид списка: условие по kind и created_at читает
+    только окно из индекса (kind, created_at, recipe).
+    """
+    activity = defaultdict(lambda: [0, 0])
+    for column, kind in enumerate((UserRecipe.FAVORITE, UserRecipe.CART)):
+        for recipe_id, total in UserRecipe.objects.filter(
+            kind=kind, created_at__gte=since
+        ).values('recipe').annotate(total=Count('*')).values_list(
+            'recipe', 'total'
+        ).order_by():
+            activity[recipe_id][column] = total
+    return activity
+
+
+def refresh_scores(batch_size=1000):
+    """Пересчитывает RecipeScore; возвращает число рецептов в рейтинге."""
+    now = timezone.now()
+    since = now - timedelta(days=settings.RECIPE_SCORES['WINDOW_DAYS'])
+    activity = recent_activity(since)
+    recipe_ids = list(activity)
+    scores = [
+        RecipeScore(
+            recipe_id=recipe_id,
+            score=get_score(*activity[recipe_id], pub_date, now),
+            favorites=activity[recipe_id][0],
+            carts=activity[recipe_id][1],
+            computed_at=now,
+        )
+        for start in range(0, len(recipe_ids), batch_size)
+        for recipe_id, pub_date in Recipe.objects.filter(
+            pk__in=recipe_ids[start:start + batch_size]
+        ).values_list('id', 'pub_date')
+    ]
+    with transaction.atomic():
+        RecipeScore.objects.bulk_create(
+            scores,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=['recipe'],
+            update_fields=['score', 'favorites', 'carts', 'computed_at'],
+        )
+        RecipeScore.objects.filter(computed_at__lt=now).delete()
+    return len(scores)
@@ -6,7 +6,11 @@ from .models import Follow, User
 @admin.register(User)
 class UserAdmin(admin.ModelAdmin):
 
-    list_display = ('id', 'username', 'first_name', 'last_name', 'email', )
+    list_display = (
+        'id', 'username', 'first_name', 'last_name', 'email',
+        'recipes_count', 'followers_count',
+    )
+    readonly_fields = ('recipes_count', 'followers_count', )
     search_fields = ('username', 'email', )
     list_filter = ('first_name', 'email', )
     list_display_links = ('username', )
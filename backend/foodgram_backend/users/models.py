@@ -1,8 +1,23 @@
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager
 from django.core.exceptions import ValidationError
 from django.db import models
 
 
+class UserQuerySet(models.QuerySet):
+
+    def with_is_subscribed(self, user):
+        """Флаг подписки текущего пользователя одним запросом на выборку."""
+        if user.is_anonymous:
+            return self.annotate(is_subscribed=models.Value(False))
+        return self.annotate(is_subscribed=models.Exists(
+            Follow.objects.filter(follower=user, author=models.OuterRef('pk'))
+        ))
+
+
+class CustomUserManager(UserManager.from_queryset(UserQuerySet)):
+    pass
+
+
 class User(AbstractUser):
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
@@ -10,6 +25,9 @@ class User(AbstractUser):
     email = models.EmailField(unique=True, verbose_name='email')
     first_name = models.CharField(max_length=150, verbose_name='first name')
     last_name = models.CharField(max_length=150, verbose_name='last name')
+    # Устаревшие связи: списки хранятся в recipes.UserRecipe, строки
+    # отсюда переносятся после migrate (recipes.legacy). Поля удаляются
+    # следующим релизом, как и модели Favorites и Carts.
     shopping_cart = models.ManyToManyField(
         'recipes.Recipe',
         related_name='users',
@@ -21,6 +39,18 @@ class User(AbstractUser):
         blank=True,
         verbose_name='Лист избранного',
     )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Рецептов',
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Подписчиков',
+    )
+
+    objects = CustomUserManager()
 
     class Meta:
         verbose_name = 'user'
@@ -58,11 +88,11 @@ class Follow(models.Model):
         verbose_name_plural = 'Подписка'
 
     def clean(self):
-        if self.follower == self.following:
+        if self.follower_id == self.author_id:
             raise ValidationError('You cannot follow yourself')
         if Follow.objects.filter(
-            follower=self.follower, following=self.following
-        ).exists():
+            follower=self.follower_id, author=self.author_id
+        ).exclude(pk=self.pk).exists():
             raise ValidationError('You are already following this user')
 
     def save(self, *args, **kwargs):